@@ -0,0 +1,170 @@
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite, общий для всех процессов на одной машине.
+
+    В отличие от LocMemCache его видят все воркеры gunicorn, поэтому
+    сброс кеша в одном процессе действует во всех. Целые числа хранятся
+    как INTEGER, и incr выполняется одним UPDATE под блокировкой базы.
+    LOCATION — путь к файлу. Устаревшие и лишние записи чистятся не
+    при каждой записи, а с вероятностью OPTIONS['CULL_PROBABILITY'].
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        self._cull_probability = params.get('OPTIONS', {}).get(
+            'CULL_PROBABILITY', 0.01
+        )
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+            )
+            db.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            self._local.db, self._local.pid = db, pid
+        return self._local.db
+
+    @staticmethod
+    def _dump(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _cull(self, db):
+        db.execute('DELETE FROM cache WHERE expires <= ?', [time.time()])
+        count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count > self._max_entries:
+            db.execute(
+                'DELETE FROM cache WHERE rowid IN '
+                '(SELECT rowid FROM cache ORDER BY rowid LIMIT ?)',
+                [count // self._cull_frequency or 1],
+            )
+
+    def _write(self, sql, params):
+        db = self._db
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            changed = db.execute(sql, params).rowcount
+            if changed and random.random() < self._cull_probability:
+                self._cull(db)
+        return changed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._write(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires <= ?',
+            [self._key(key, version), self._dump(value),
+             self.get_backend_timeout(timeout), time.time()],
+        ))
+
+    def get(self, key, default=None, version=None):
+        row = self._db.execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self._key(key, version), time.time()],
+        ).fetchone()
+        return default if row is None else self._load(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            [*keys, time.time()],
+        )
+        return {keys[key]: self._load(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(
+            'REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            [self._key(key, version), self._dump(value),
+             self.get_backend_timeout(timeout)],
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._db as db:
+            return bool(db.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                [self.get_backend_timeout(timeout), self._key(key, version),
+                 time.time()],
+            ).rowcount)
+
+    def delete(self, key, version=None):
+        with self._db as db:
+            db.execute('DELETE FROM cache WHERE key = ?',
+                       [self._key(key, version)])
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            with self._db as db:
+                db.execute(
+                    'DELETE FROM cache WHERE key IN (%s)'
+                    % ', '.join('?' * len(keys)),
+                    keys,
+                )
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version) is not self
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                [key, time.time()],
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            if not isinstance(row[0], int):
+                value = self._load(row[0]) + delta
+                db.execute('UPDATE cache SET value = ? WHERE key = ?',
+                           [self._dump(value), key])
+                return value
+            db.execute('UPDATE cache SET value = value + ? WHERE key = ?',
+                       [delta, key])
+            return row[0] + delta
+
+    def clear(self):
+        with self._db as db:
+            db.execute('DELETE FROM cache')
@@ -0,0 +1,82 @@
+import logging
+
+from django.conf import settings
+from django.core import checks
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+from . import staticfiles
+from .templates_warmup import uses_cached_loader
+
+logger = logging.getLogger('yatube.checks')
+
+SLOW_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _warning(number, message, hint):
+    return checks.Warning(message, hint=hint, id=f'yatube.W{number:03}')
+
+
+def _database_warnings():
+    for alias, database in settings.DATABASES.items():
+        if not database.get('CONN_MAX_AGE'):
+            yield _warning(3, f'База {alias}: соединение открывается на '
+                              'каждый запрос.', 'Задайте CONN_MAX_AGE.')
+        if (database['ENGINE'].endswith('sqlite3') and str(
+                settings.SQLITE_PRAGMAS.get('journal_mode')).lower() != 'wal'):
+            yield _warning(4, f'База {alias}: SQLite без WAL, чтения ждут '
+                              'записи.',
+                           "Задайте SQLITE_PRAGMAS['journal_mode'] = 'wal'.")
+
+
+@checks.register('performance', deploy=True)
+def check_performance_settings(app_configs, **kwargs):
+    """Настройки, с которыми сайт работает, но медленно."""
+    warnings = list(_database_warnings())
+    if settings.DEBUG:
+        warnings.append(_warning(
+            1, 'DEBUG включён: каждый SQL-запрос сохраняется в памяти.',
+            'Запускайте с DJANGO_ENV=prod.'))
+    if any(isinstance(backend, DjangoTemplates)
+           for backend in engines.all()) and not uses_cached_loader():
+        warnings.append(_warning(
+            2, 'Шаблоны разбираются заново на каждый запрос.',
+            'Оберните загрузчики в django.template.loaders.cached.Loader.'))
+    if settings.CACHES['default']['BACKEND'] in SLOW_CACHES:
+        warnings.append(_warning(
+            5, 'Кеш не общий для воркеров: сброс в одном процессе не '
+               'виден в других.',
+            'Используйте core.cache.SQLiteCache или memcached.'))
+    if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.db':
+        warnings.append(_warning(
+            6, 'Сессия читается из базы на каждый запрос.',
+            "SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'"))
+    if not any(name.endswith('GZipMiddleware')
+               for name in settings.MIDDLEWARE):
+        warnings.append(_warning(
+            7, 'Ответы отдаются без сжатия.',
+            'Добавьте core.middleware.GZipMiddleware в MIDDLEWARE.'))
+    if settings.EMAIL_BACKEND.endswith('filebased.EmailBackend'):
+        warnings.append(_warning(
+            8, 'Письма пишутся в файлы, а не отправляются.',
+            'Задайте EMAIL_BACKEND для SMTP.'))
+    if (settings.STATICFILES_STORAGE.endswith(
+            'CompressedManifestStaticFilesStorage')
+            and staticfiles.brotli is None):
+        warnings.append(_warning(
+            9, 'Пакет brotli не установлен: статика сжимается только gzip.',
+            'pip install -r requirements.txt'))
+    return warnings
+
+
+def report_at_startup():
+    """Пишет предупреждения о производительности в лог при старте воркера."""
+    if not settings.PERFORMANCE_CHECKS_AT_STARTUP:
+        return
+    for message in checks.run_checks(
+        include_deployment_checks=True, tags=['performance']
+    ):
+        logger.warning('%s', message)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.templates_warmup import precompile
+
+
+class Command(BaseCommand):
+    help = ('Проверяет и компилирует все шаблоны, как это делает воркер '
+            'при старте.')
+
+    def handle(self, *args, **options):
+        count, errors = precompile()
+        for name, error in errors:
+            self.stderr.write(f'{name}: {error}')
+        if errors:
+            raise CommandError(f'Ошибок в шаблонах: {len(errors)}')
+        self.stdout.write(f'Скомпилировано шаблонов: {count}')
@@ -0,0 +1,157 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=3600'
+# Имена вида ab/<sha256>.jpg даёт ContentAddressedStorage.
+CONTENT_ADDRESSED = re.compile(r'(^|/)[0-9a-f]{64}\.\w+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+SENDFILE_HEADERS = {
+    'x-sendfile': 'X-Sendfile',
+    'x-accel-redirect': 'X-Accel-Redirect',
+}
+
+
+class FileRange:
+    """Часть открытого файла для ответа 206.
+
+    fileno() остаётся настоящим: gunicorn отдаёт такой файл через
+    sendfile с текущей позиции и ровно на Content-Length байт.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def cache_control(path):
+    """Миниатюры и оригиналы с хешем в имени никогда не меняются."""
+    prefix = getattr(settings, 'THUMBNAIL_PREFIX', 'cache/')
+    if path.startswith(prefix) or CONTENT_ADDRESSED.search(path):
+        return IMMUTABLE
+    return REVALIDATE
+
+
+def parse_range(header, size):
+    """(начало, конец) включительно, None — отдать весь файл.
+
+    Несколько диапазонов в одном запросе не поддерживаются, такой
+    запрос получает файл целиком. Для недостижимого диапазона
+    возвращает False.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def requested_range(request, etag, info):
+    """Диапазон из Range, если If-Range не говорит, что файл сменился."""
+    header = request.META.get('HTTP_RANGE')
+    if header is None:
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is not None and if_range != etag and (
+        parse_http_date_safe(if_range) != int(info.st_mtime)
+    ):
+        return None
+    return parse_range(header, info.st_size)
+
+
+def hand_off(response, path, full_path):
+    mode = settings.MEDIA_SENDFILE
+    if mode == 'x-sendfile':
+        response[SENDFILE_HEADERS[mode]] = full_path
+    else:
+        response[SENDFILE_HEADERS[mode]] = settings.MEDIA_ACCEL_PREFIX + path
+    return response
+
+
+def serve(request, path):
+    """Отдаёт файл из MEDIA_ROOT с ETag, Range и долгим кешем.
+
+    MEDIA_SENDFILE = 'x-sendfile' или 'x-accel-redirect' передаёт
+    отправку файла фронтенду (Apache, lighttpd, nginx), он же
+    обрабатывает Range. Иначе файл отдаёт сам Django через
+    wsgi.file_wrapper, который в gunicorn использует sendfile.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        info = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404
+    etag = '"{:x}-{:x}-{:x}"'.format(
+        info.st_ino, info.st_size, info.st_mtime_ns
+    )
+    content_type = mimetypes.guess_type(full_path)[0]
+    response = HttpResponse(
+        content_type=content_type or 'application/octet-stream'
+    )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(info.st_mtime)
+    response['Cache-Control'] = cache_control(path)
+    response['Accept-Ranges'] = 'bytes'
+    conditional = get_conditional_response(
+        request, etag, int(info.st_mtime), response
+    )
+    if conditional is not response:
+        return conditional
+    if settings.MEDIA_SENDFILE:
+        return hand_off(response, path, full_path)
+    byte_range = requested_range(request, etag, info)
+    if byte_range is False:
+        response.status_code = 416
+        response['Content-Range'] = f'bytes */{info.st_size}'
+        return response
+    start, end = byte_range or (0, info.st_size - 1)
+    response['Content-Length'] = end - start + 1
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{info.st_size}'
+    if request.method == 'HEAD':
+        return response
+    return stream(full_path, response, start, end - start + 1)
+
+
+def stream(full_path, response, start, length):
+    """Тело для готовых заголовков: весь файл или его часть."""
+    file = open(full_path, 'rb')
+    if response.status_code == 206:
+        file = FileRange(file, start, length)
+    streamed = FileResponse(file, status=response.status_code)
+    for header, value in response.items():
+        streamed[header] = value
+    return streamed
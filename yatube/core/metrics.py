@@ -0,0 +1,216 @@
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger('yatube.slow_requests')
+
+# Верхние границы корзин гистограммы задержки, секунды.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса: число и время SQL, время рендера."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.slowest = []
+        self._render_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.sql_seconds += duration
+            self.slowest.append((duration, sql))
+
+
+class Registry:
+    """Метрики процесса в формате Prometheus.
+
+    Каждый воркер считает своё; Prometheus различает их по instance.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = defaultdict(int)
+            self.buckets = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+            self.latency = defaultdict(float)
+            self.queries = defaultdict(int)
+            self.sql_seconds = defaultdict(float)
+            self.render_seconds = defaultdict(float)
+            self.cache = defaultdict(int)
+
+    def observe(self, view, status, seconds, request_metrics):
+        with self.lock:
+            self.requests[view, f'{status // 100}xx'] += 1
+            self.buckets[view][bisect_left(BUCKETS, seconds)] += 1
+            self.latency[view] += seconds
+            self.queries[view] += request_metrics.queries
+            self.sql_seconds[view] += request_metrics.sql_seconds
+            self.render_seconds[view] += request_metrics.render_seconds
+
+    def count_cache(self, name, hit):
+        with self.lock:
+            self.cache[name, 'hit' if hit else 'miss'] += 1
+
+    def cache_counts(self, name):
+        """Попадания и промахи кеша name."""
+        with self.lock:
+            return self.cache[name, 'hit'], self.cache[name, 'miss']
+
+    def render(self):
+        """Текст для /metrics в формате Prometheus 0.0.4."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(
+                    f'{key}="{label}"' for key, label in labels
+                )
+                lines.append(f'{name}{{{label_text}}} {value}')
+
+        with self.lock:
+            metric(
+                'yatube_requests_total', 'counter', 'Запросы по view.',
+                [((('view', view), ('status', status)), count)
+                 for (view, status), count in sorted(self.requests.items())]
+            )
+            lines.append('# HELP yatube_request_duration_seconds '
+                         'Время ответа view.')
+            lines.append('# TYPE yatube_request_duration_seconds histogram')
+            for view, counts in sorted(self.buckets.items()):
+                total = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                    total += count
+                    lines.append(
+                        'yatube_request_duration_seconds_bucket'
+                        f'{{view="{view}",le="{bound}"}} {total}'
+                    )
+                lines.append(
+                    f'yatube_request_duration_seconds_sum{{view="{view}"}} '
+                    f'{self.latency[view]:.6f}'
+                )
+                lines.append(
+                    f'yatube_request_duration_seconds_count{{view="{view}"}} '
+                    f'{total}'
+                )
+            for name, help_text, values, fmt in (
+                ('yatube_db_queries_total', 'Запросы к базе.',
+                 self.queries, '{}'),
+                ('yatube_db_seconds_total', 'Время запросов к базе.',
+                 self.sql_seconds, '{:.6f}'),
+                ('yatube_template_render_seconds_total',
+                 'Время рендера шаблонов.', self.render_seconds, '{:.6f}'),
+            ):
+                metric(name, 'counter', help_text, [
+                    ((('view', view),), fmt.format(value))
+                    for view, value in sorted(values.items())
+                ])
+            metric(
+                'yatube_cache_requests_total', 'counter',
+                'Обращения к кешам приложения.',
+                [((('cache', name), ('result', result)), count)
+                 for (name, result), count in sorted(self.cache.items())]
+            )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def count_cache(name, hit):
+    registry.count_cache(name, hit)
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, context=None, request=None):
+        # Шаблон, отрендеренный внутри другого, уже посчитан внешним.
+        request_metrics = _current.get()
+        if request_metrics is None or request_metrics._render_depth:
+            return super().render(context, request)
+        request_metrics._render_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            request_metrics.render_seconds += time.perf_counter() - started
+            request_metrics._render_depth -= 1
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Бэкенд шаблонов, который отдаёт время рендера в метрики запроса."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self
+        )
+
+
+class MetricsMiddleware:
+    """Задержка, SQL и рендер каждого запроса в registry.
+
+    Медленные запросы с вероятностью METRICS_TRACE_SAMPLE_RATE пишутся
+    в лог yatube.slow_requests вместе с самыми долгими запросами к базе.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(request_metrics)
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        registry.observe(view, response.status_code, seconds, request_metrics)
+        if (seconds * 1000 >= settings.METRICS_SLOW_REQUEST_MS
+                and random.random() < settings.METRICS_TRACE_SAMPLE_RATE):
+            self.trace(request, view, seconds, request_metrics)
+        return response
+
+    def trace(self, request, view, seconds, request_metrics):
+        slowest = sorted(request_metrics.slowest, reverse=True)[:5]
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.1f мс, SQL %d за %.1f мс, '
+            'рендер %.1f мс\n%s',
+            request.method, request.path, view, seconds * 1000,
+            request_metrics.queries, request_metrics.sql_seconds * 1000,
+            request_metrics.render_seconds * 1000,
+            '\n'.join(f'  {duration * 1000:.1f} мс  {sql}'
+                      for duration, sql in slowest),
+        )
@@ -0,0 +1,20 @@
+from django.middleware.gzip import GZipMiddleware as BaseGZipMiddleware
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript',
+    'application/xml', 'image/svg+xml',
+)
+
+
+class GZipMiddleware(BaseGZipMiddleware):
+    """Сжимает только текст.
+
+    Картинки из MEDIA уже сжаты, а ответ 206 после сжатия перестаёт
+    совпадать со своим Content-Range.
+    """
+
+    def process_response(self, request, response):
+        if (response.status_code == 206 or not response.get(
+                'Content-Type', '').startswith(COMPRESSIBLE_TYPES)):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,89 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_replica = ContextVar('replica', default=None)
+_writes = ContextVar('writes', default=None)
+
+
+@contextmanager
+def use_replica():
+    """Чтения внутри блока идут в одну случайную реплику."""
+    replicas = settings.DATABASE_REPLICAS
+    token = _replica.set(random.choice(replicas) if replicas else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def replica_reads(view):
+    """Отправляет чтения view в реплику.
+
+    Только для безопасных запросов и только если пользователь недавно
+    ничего не записывал: иначе он может не увидеть свой же пост.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in SAFE_METHODS
+                or STICKY_COOKIE in request.COOKIES):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Пишет всегда в default, читает из реплики внутри use_replica()."""
+
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        # В открытой транзакции читаем свои же незакоммиченные записи.
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None:
+            writes.append(model)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class PrimaryStickinessMiddleware:
+    """После записи держит чтения пользователя в default, пока реплики
+    догоняют основную базу.
+
+    Записью считается и небезопасный метод, и любое обращение к
+    db_for_write во время запроса: подписка по ссылке идёт через GET.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = []
+        token = _writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _writes.reset(token)
+        if request.method not in SAFE_METHODS or writes:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.PRIMARY_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,133 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import (DEFAULT_DB_ALIAS, OperationalError, connections,
+                       transaction)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_thread_lock = threading.Lock()
+_local = threading.local()
+
+
+def _lock_file():
+    # Файл открывается заново после fork: flock общий у копий дескриптора.
+    if fcntl is None:
+        return None
+    key = (os.getpid(), settings.SQLITE_WRITE_LOCK)
+    if getattr(_local, 'key', None) != key:
+        if getattr(_local, 'file', None) is not None:
+            _local.file.close()
+        _local.file = open(settings.SQLITE_WRITE_LOCK, 'a')
+        _local.key = key
+    return _local.file
+
+
+@contextmanager
+def write_lock():
+    """Один писатель на базу: потоки ждут друг друга и другие процессы.
+
+    Без fcntl (Windows) запись упорядочена только внутри процесса.
+    """
+    with _thread_lock:
+        lock_file = _lock_file()
+        if lock_file is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def is_locked(error):
+    """Ошибка SQLITE_BUSY или SQLITE_LOCKED, а не что-то с тем же словом."""
+    message = str(error)
+    return (message == 'database is locked'
+            or message.startswith('database table is locked'))
+
+
+def after_write(func, *args):
+    """Откладывает func до конца текущей run_serialized.
+
+    Для записей, которым не нужно попадать в ту же транзакцию
+    (рассылка поста по лентам): блокировку на них не держим, они
+    идут отдельной короткой записью. Вне run_serialized func
+    выполняется сразу.
+    """
+    deferred = getattr(_local, 'deferred', None)
+    if deferred is None:
+        return func(*args)
+    deferred.append((func, args))
+
+
+def on_rollback(func, *args):
+    """Уборка за неудачной попыткой run_serialized: файлы и прочее,
+    что не откатывается вместе с транзакцией. Вне run_serialized
+    ничего не делает.
+    """
+    rollback = getattr(_local, 'rollback', None)
+    if rollback is not None:
+        rollback.append((func, args))
+
+
+def _attempt(func, args, kwargs):
+    _local.deferred, _local.rollback = [], []
+    try:
+        with write_lock():
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs), _local.deferred
+            except Exception:
+                for callback, callback_args in _local.rollback:
+                    callback(*callback_args)
+                raise
+    finally:
+        _local.deferred = _local.rollback = None
+
+
+def run_serialized(func, *args, **kwargs):
+    """Выполняет func в транзакции под write_lock, повторяя при блокировке.
+
+    Базу всё равно может занять тот, кто пишет мимо блокировки
+    (админка, фоновые миниатюры); тогда транзакция откатывается и
+    повторяется с экспоненциальной задержкой. Поэтому func — только
+    сама запись: проверка формы и рендер идут без блокировки.
+    """
+    retries = settings.SQLITE_WRITE_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            result, deferred = _attempt(func, args, kwargs)
+            break
+        except OperationalError as error:
+            if not is_locked(error) or attempt == retries:
+                raise
+        time.sleep(
+            settings.SQLITE_WRITE_BACKOFF * 2 ** attempt
+            * (1 + random.random())
+        )
+    for callback, callback_args in deferred:
+        serialized_write(callback, *callback_args)
+    return result
+
+
+def serialized_write(func, *args, **kwargs):
+    """Запись из view: через run_serialized, если база — SQLite.
+
+    Уже открытую транзакцию не повторить, в ней func выполняется как
+    есть. Другие базы пишут без блокировки, но тоже атомарно.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.in_atomic_block:
+        return func(*args, **kwargs)
+    if connection.vendor != 'sqlite':
+        with transaction.atomic():
+            return func(*args, **kwargs)
+    return run_serialized(func, *args, **kwargs)
@@ -0,0 +1,183 @@
+import gzip
+import json
+import mimetypes
+import os
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = frozenset((
+    '.css', '.js', '.map', '.svg', '.ico', '.json', '.txt', '.html', '.xml',
+))
+# Сжатая копия хранится, только если она заметно меньше оригинала.
+MIN_SAVING = 0.95
+BLOCK_SIZE = 64 * 1024
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=60'
+
+
+def _compressors():
+    yield '.gz', lambda data: gzip.compress(data, 9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем в имени и сжатыми копиями .gz и .br рядом.
+
+    Всё готовится в collectstatic, в запросе ничего не сжимается.
+    Пока collectstatic не запускали (разработка, тесты), {% static %}
+    отдаёт исходные имена.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if not dry_run and not isinstance(processed, Exception):
+                self.compress(name)
+                if hashed_name:
+                    self.compress(hashed_name)
+            yield name, hashed_name, processed
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+            return
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            data = source.read()
+        for suffix, compress in _compressors():
+            compressed = compress(data)
+            if len(compressed) < len(data) * MIN_SAVING:
+                with open(path + suffix, 'wb') as target:
+                    target.write(compressed)
+
+
+class StaticFile:
+    def __init__(self, path, immutable):
+        self.variants = {}
+        stat = os.stat(path)
+        # У каждой кодировки свой ETag: байты ответа у них разные.
+        tag = f'{stat.st_size:x}-{int(stat.st_mtime):x}'
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz'), (None, '')):
+            if os.path.exists(path + suffix):
+                self.variants[encoding] = (
+                    path + suffix,
+                    os.stat(path + suffix).st_size,
+                    f'"{tag}-{encoding}"' if encoding else f'"{tag}"',
+                )
+        self.content_type = (
+            mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        )
+        self.cache_control = IMMUTABLE if immutable else REVALIDATE
+
+
+def _quality(params):
+    """q из параметров кодировки; нечитаемое значение считаем за 1."""
+    for param in params:
+        name, _, value = param.strip().partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                return float(value)
+            except ValueError:
+                return 1
+    return 1
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, которые клиент не запретил (q=0)."""
+    accepted = set()
+    for item in header.split(','):
+        encoding, *params = item.split(';')
+        if _quality(params) > 0:
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+
+def none_match(header, etag):
+    """Совпадает ли If-None-Match с etag (слабое сравнение, RFC 7232)."""
+    etags = parse_etags(header)
+    return '*' in etags or any(
+        (tag[2:] if tag.startswith('W/') else tag) == etag for tag in etags
+    )
+
+
+class StaticFilesApp:
+    """WSGI-слой перед Django для файлов из STATIC_ROOT.
+
+    Список файлов строится один раз при старте. Файлы с хешем в
+    имени отдаются с Cache-Control: immutable, сжатая копия выбирается
+    по Accept-Encoding, тело отдаёт wsgi.file_wrapper сервера
+    (в gunicorn это sendfile). Остальные запросы уходят в Django.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = root or settings.STATIC_ROOT
+        self.prefix = prefix or settings.STATIC_URL
+        self.files = self.scan() if self.root and os.path.isdir(
+            self.root
+        ) else {}
+
+    def scan(self):
+        hashed = set()
+        manifest = os.path.join(self.root, 'staticfiles.json')
+        if os.path.exists(manifest):
+            with open(manifest, encoding='utf-8') as stream:
+                hashed.update(json.load(stream).get('paths', {}).values())
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(('.gz', '.br')):
+                    continue
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, self.root).replace(
+                    os.sep, '/'
+                )
+                files[self.prefix + relative] = StaticFile(
+                    path, relative in hashed
+                )
+        return files
+
+    def __call__(self, environ, start_response):
+        static = self.files.get(environ.get('PATH_INFO', ''))
+        method = environ.get('REQUEST_METHOD')
+        if static is None or method not in ('GET', 'HEAD'):
+            return self.application(environ, start_response)
+        accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding = next(
+            (encoding for encoding in ('br', 'gzip')
+             if encoding in accepted and encoding in static.variants),
+            None,
+        )
+        path, size, etag = static.variants[encoding]
+        headers = [
+            ('Content-Type', static.content_type),
+            ('Cache-Control', static.cache_control),
+            ('ETag', etag),
+        ]
+        if len(static.variants) > 1:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if none_match(environ.get('HTTP_IF_NONE_MATCH', ''), etag):
+            start_response('304 Not Modified', headers)
+            return []
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('Content-Length', str(size)))
+        start_response('200 OK', headers)
+        if method == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(path, 'rb'), BLOCK_SIZE)
@@ -0,0 +1,76 @@
+import logging
+import os
+
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.template.loaders.cached import Loader as CachedLoader
+
+logger = logging.getLogger(__name__)
+
+
+def template_names(engine):
+    """Имена всех файлов в DIRS движка, то есть в templates/ проекта.
+
+    Шаблоны приложений (админка) загружаются по мере надобности.
+    """
+    names = set()
+    for root in engine.dirs:
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                if not filename.startswith('.'):
+                    names.add(os.path.relpath(
+                        os.path.join(directory, filename), root
+                    ).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def references(template):
+    """Шаблоны из {% extends %} и {% include %} с именем-константой."""
+    for node in (template.nodelist.get_nodes_by_type(ExtendsNode)
+                 + template.nodelist.get_nodes_by_type(IncludeNode)):
+        expression = getattr(node, 'parent_name', None) or node.template
+        if isinstance(expression.var, str) and not expression.filters:
+            yield expression.var
+
+
+def precompile():
+    """Разбирает все шаблоны движков DjangoTemplates.
+
+    С cached loader разобранные шаблоны остаются в его кеше, и первому
+    запросу воркера парсить уже нечего. Возвращает число шаблонов и
+    список (имя, ошибка): синтаксис, ссылка на несуществующий шаблон,
+    кодировка файла или ошибка тега — прогрев не должен ронять воркер.
+    """
+    count, errors = 0, []
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        engine = backend.engine
+        for name in template_names(engine):
+            count += 1
+            try:
+                template = engine.get_template(name)
+                for reference in references(template):
+                    engine.get_template(reference)
+            except Exception as error:
+                errors.append((name, error))
+    return count, errors
+
+
+def uses_cached_loader():
+    return any(
+        isinstance(loader, CachedLoader)
+        for backend in engines.all() if isinstance(backend, DjangoTemplates)
+        for loader in backend.engine.template_loaders
+    )
+
+
+def warm_up():
+    """Прогрев при старте воркера; без cached loader он бесполезен."""
+    if not uses_cached_loader():
+        return
+    count, errors = precompile()
+    for name, error in errors:
+        logger.warning('Шаблон %s не компилируется: %s', name, error)
+    logger.info('Скомпилировано шаблонов: %d', count)
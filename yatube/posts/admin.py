@@ -26,6 +26,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save_new_version()
+        else:
+            super().save_model(request, obj, form, change)
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
@@ -0,0 +1,60 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Follow, Post, User
+
+
+def for_user(user):
+    """Счётчики пользователя; без строки в таблице — нули.
+
+    Чтобы не было лишнего запроса, user берут с select_related('stats').
+    """
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(user=user)
+
+
+def bump(user_id, field, delta):
+    """Атомарно меняет один счётчик пользователя на delta."""
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats.filter(**{f'{field}__gte': -delta}).update(
+            **{field: F(field) + delta}
+        )
+        return
+    if not stats.update(**{field: F(field) + delta}):
+        _, created = AuthorStats.objects.get_or_create(
+            user_id=user_id, defaults={field: delta}
+        )
+        if not created:
+            stats.update(**{field: F(field) + delta})
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('user_id')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total')
+        ),
+        0,
+    )
+
+
+def rebuild():
+    """Пересчитывает счётчики всех пользователей по постам и подпискам."""
+    AuthorStats.objects.bulk_create(
+        [
+            AuthorStats(user_id=user_id)
+            for user_id in User.objects.filter(
+                stats__isnull=True
+            ).values_list('pk', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+    return AuthorStats.objects.update(
+        post_count=_count(Post.objects, 'author'),
+        follower_count=_count(Follow.objects, 'author'),
+        following_count=_count(Follow.objects, 'user'),
+    )
@@ -0,0 +1,247 @@
+import itertools
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.db import OperationalError, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import mixer
+
+from . import transfer
+from .models import Follow, Group, Post, User
+from .paginators import encode_cursor
+
+
+def _pick(rng, size):
+    """Индекс с перекосом: немногие авторы пишут и читаются больше всех."""
+    return min(int(rng.paretovariate(1.2)) - 1, size - 1)
+
+
+def seed(posts, users, follows, groups=20, comments=None, random_seed=1):
+    """Заполняет базу синтетическими данными заданного масштаба.
+
+    Группы создаёт mixer, тексты и имена — Faker; посты и комментарии
+    идут через transfer.Importer, то есть bulk_create пачками с
+    пересчётом счётчиков и лент в конце.
+    """
+    rng = random.Random(random_seed)
+    Faker.seed(random_seed)
+    fake = Faker('ru_RU')
+    comments = posts // 5 if comments is None else comments
+    mixer.cycle(groups).blend(
+        Group,
+        title=(fake.catch_phrase()[:200] for _ in range(groups)),
+        slug=(f'group-{number}' for number in range(groups)),
+        description=(fake.paragraph() for _ in range(groups)),
+    )
+    slugs = [f'group-{number}' for number in range(groups)] + [None]
+    usernames = [f'{fake.user_name()}-{number}' for number in range(users)]
+    User.objects.bulk_create(
+        [User(username=username, first_name=fake.first_name(),
+              last_name=fake.last_name())
+         for username in usernames],
+    )
+    user_ids = dict(
+        User.objects.filter(username__in=usernames).values_list(
+            'username', 'pk'
+        )
+    )
+    ids = list(user_ids.values())
+    edges = {
+        (rng.choice(ids), ids[_pick(rng, len(ids))]) for _ in range(follows)
+    }
+    Follow.objects.bulk_create(
+        [Follow(user_id=user, author_id=author)
+         for user, author in edges if user != author],
+        ignore_conflicts=True,
+    )
+    importer = transfer.Importer()
+    start = (Post.objects.order_by('-pk').values_list('pk', flat=True)
+             .first() or 0) + 1
+    now = timezone.now()
+    for number in range(posts):
+        importer.add({
+            'model': 'post',
+            'id': start + number,
+            'author': usernames[_pick(rng, users)],
+            'group': rng.choice(slugs),
+            'text': fake.sentence(nb_words=rng.randint(5, 40)),
+            'pub_date': (now - timedelta(minutes=posts - number)).isoformat(),
+        })
+    for number in range(comments):
+        importer.add({
+            'model': 'comment',
+            'post': start + _pick(rng, posts),
+            'author': rng.choice(usernames),
+            'text': fake.sentence(),
+            'pub_date': now.isoformat(),
+        })
+    return importer.finish()
+
+
+def targets():
+    """Страницы для замера и пользователь, от имени которого их открывать."""
+    post = Post.objects.order_by('-comment_count').first()
+    author = User.objects.order_by('-stats__post_count').first()
+    reader = User.objects.order_by('-stats__following_count').first()
+    group = Group.objects.first()
+    deep = Post.objects.order_by('-pub_date', '-pk').values_list(
+        'pub_date', 'pk'
+    )[min(Post.objects.count() - 1, 1000)]
+    return reader, {
+        'index': reverse('posts:index'),
+        'index_deep': '{}?cursor={}'.format(
+            reverse('posts:index'), encode_cursor(*deep)
+        ),
+        'group_list': reverse('posts:group_list',
+                              kwargs={'slug': group.slug}),
+        'profile': reverse('posts:profile',
+                           kwargs={'username': author.username}),
+        'post_detail': reverse('posts:post_detail',
+                               kwargs={'post_id': post.pk}),
+        'follow_index': reverse('posts:follow_index'),
+    }
+
+
+class QueryCounter:
+    """Считает запросы, не включая отладочный лог соединения."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def measure(client, url, requests, before_request=None):
+    """Задержка, число запросов к базе и пик памяти одной страницы.
+
+    Запросы считаются по всем базам, включая реплики.
+    """
+    timings = []
+    queries = []
+    for _ in range(requests):
+        if before_request is not None:
+            before_request()
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: {response.status_code}')
+    if before_request is not None:
+        before_request()
+    tracemalloc.start()
+    client.get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p90_ms': round(percentile(timings, 0.9), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': max(queries),
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+
+
+def run(requests, before_request=None):
+    reader, urls = targets()
+    client = Client()
+    client.force_login(reader)
+    return {
+        name: measure(client, url, requests, before_request)
+        for name, url in urls.items()
+    }
+
+
+def _load(deadline, work):
+    """Повторяет work до дедлайна; возвращает задержки и число ошибок."""
+    timings, errors = [], 0
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                ok = work()
+            except OperationalError:
+                ok = False
+            if ok:
+                timings.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+    finally:
+        connections.close_all()
+    return timings, errors
+
+
+def concurrency(readers, writers, seconds):
+    """Чтения и записи одновременно из нескольких потоков.
+
+    Читатели открывают ленту и самый обсуждаемый пост, писатели
+    комментируют этот пост. У каждого потока свой клиент и свои
+    соединения с базой. Пропускная способность чтения при writers > 0
+    не должна заметно падать по сравнению с writers = 0.
+    """
+    user, urls = targets()
+    post = Post.objects.order_by('-comment_count').first()
+    comment_url = reverse('posts:add_comment', kwargs={'post_id': post.pk})
+    read_urls = [urls['index'], urls['post_detail']]
+    deadline = time.perf_counter() + seconds
+    results = {'reads': ([], 0), 'writes': ([], 0)}
+    lock = threading.Lock()
+
+    def reader():
+        client = Client()
+        pages = itertools.cycle(read_urls)
+        outcome = _load(
+            deadline, lambda: client.get(next(pages)).status_code == 200
+        )
+        collect('reads', outcome)
+
+    def writer(number):
+        client = Client()
+        client.force_login(user)
+        outcome = _load(deadline, lambda: client.post(
+            comment_url, {'text': f'Нагрузка {number}'}
+        ).status_code == 302)
+        collect('writes', outcome)
+
+    def collect(kind, outcome):
+        with lock:
+            timings, errors = results[kind]
+            results[kind] = (timings + outcome[0], errors + outcome[1])
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(number,))
+                for number in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report = {'readers': readers, 'writers': writers}
+    for kind, (timings, errors) in results.items():
+        report[f'{kind}_per_second'] = round(len(timings) / seconds, 1)
+        report[f'{kind}_p99_ms'] = (
+            round(percentile(timings, 0.99), 3) if timings else None
+        )
+        report[f'{kind}_errors'] = errors
+    return report
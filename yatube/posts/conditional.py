@@ -0,0 +1,110 @@
+import hashlib
+
+from django.db.models import OuterRef, Subquery
+
+from . import feed_cache
+from .models import Comment, Post, User
+
+
+def _etag(*parts):
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def _user_state(request):
+    """Всё, что меняет страницу для конкретного зрителя."""
+    user_id = request.user.pk
+    if user_id is None:
+        return 'anonymous', ''
+    return user_id, feed_cache.get_generation(
+        feed_cache.user_generation_key(user_id)
+    )
+
+
+def feed_etag(request, *args, **kwargs):
+    """ETag страницы ленты без запросов к базе: только счётчики в кеше."""
+    return _etag(
+        feed_cache.get_generation(),
+        *_user_state(request),
+        request.get_full_path(),
+    )
+
+
+def feed_last_modified(request, *args, **kwargs):
+    modified = feed_cache.last_modified()
+    if request.user.pk is None:
+        return modified
+    return max(modified, feed_cache.last_modified(
+        feed_cache.user_generation_key(request.user.pk)
+    ))
+
+
+def profile_author(request, username):
+    """Автор профиля для ETag и для самой страницы: одна выборка."""
+    if not hasattr(request, '_profile_author'):
+        request._profile_author = User.objects.select_related(
+            'stats'
+        ).filter(username=username).first()
+    return request._profile_author
+
+
+def profile_etag(request, username):
+    author = profile_author(request, username)
+    if author is None:
+        return None
+    return _etag(
+        feed_etag(request),
+        feed_cache.get_generation(
+            feed_cache.author_generation_key(author.pk)
+        ),
+    )
+
+
+def profile_last_modified(request, username):
+    author = profile_author(request, username)
+    if author is None:
+        return None
+    return max(feed_last_modified(request), feed_cache.last_modified(
+        feed_cache.author_generation_key(author.pk)
+    ))
+
+
+def detail_post(request, post_id):
+    """Пост для ETag и для самой страницы: одна выборка на запрос.
+
+    Готовые миниатюры меняют version (thumbnails.ready), так что
+    страница с заглушкой не отвечает 304 после их появления.
+    """
+    if not hasattr(request, '_detail_post'):
+        last_comment = Comment.objects.filter(
+            post=OuterRef('pk')
+        ).order_by('-created').values('created')[:1]
+        request._detail_post = Post.objects.select_related(
+            'author__stats', 'group'
+        ).annotate(last_comment=Subquery(last_comment)).filter(
+            pk=post_id
+        ).first()
+    return request._detail_post
+
+
+def post_etag(request, post_id):
+    post = detail_post(request, post_id)
+    if post is None:
+        return None
+    return _etag(
+        post_id,
+        post.version,
+        post.updated.isoformat(),
+        post.comment_count,
+        post.last_comment and post.last_comment.isoformat(),
+        # Страница показывает и число постов автора.
+        feed_cache.get_generation(),
+        *_user_state(request),
+        request.get_full_path(),
+    )
+
+
+def post_last_modified(request, post_id):
+    post = detail_post(request, post_id)
+    if post is None:
+        return None
+    return max(filter(None, (post.updated, post.last_comment)))
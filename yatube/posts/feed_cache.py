@@ -0,0 +1,105 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.metrics import count_cache, registry
+
+# Меняется вместе с форматом значений, которые posts кладёт в кеш:
+# старые записи других воркеров при выкладке просто перестают читаться.
+CACHE_VERSION = 1
+FEED_CACHE_TIMEOUT = 60 * 10
+
+
+def make_key(*parts):
+    """Ключ кеша posts с версией формата."""
+    return ':'.join(('posts', f'v{CACHE_VERSION}', *map(str, parts)))
+
+
+GENERATION_KEY = make_key('feed', 'generation')
+MODIFIED_KEY = make_key('feed', 'modified')
+
+
+def _incr(key, initial=1):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, None)
+        return initial
+
+
+def get_generation(key=GENERATION_KEY):
+    """Текущее поколение ленты; все ключи страниц содержат его."""
+    generation = cache.get(key)
+    if generation is None:
+        # После вытеснения счётчика нельзя начинать с 1:
+        # старые страницы с тем же поколением ещё могут лежать в кеше.
+        cache.add(key, int(time.time() * 1000), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _modified_key(key):
+    return MODIFIED_KEY if key == GENERATION_KEY else f'{key}:modified'
+
+
+def bump_generation(key=GENERATION_KEY):
+    """Делает устаревшими все закешированные страницы ленты."""
+    get_generation(key)
+    cache.set(_modified_key(key), timezone.now(), None)
+    return _incr(key)
+
+
+def user_generation_key(user_id):
+    """Поколение того, что зависит от пользователя: его подписок."""
+    return make_key('user', user_id, 'generation')
+
+
+def author_generation_key(user_id):
+    """Поколение профиля: числа подписчиков и подписок."""
+    return make_key('author', user_id, 'generation')
+
+
+def last_modified(key=GENERATION_KEY):
+    """Время последней смены поколения key.
+
+    Если отметка вытеснена из кеша, считаем, что ленты изменились сейчас.
+    """
+    modified_key = _modified_key(key)
+    modified = cache.get(modified_key)
+    if modified is None:
+        cache.add(modified_key, timezone.now(), None)
+        modified = cache.get(modified_key)
+    return modified
+
+
+def get_page(page_key, build):
+    """Возвращает страницу из кеша или строит её через build().
+
+    В page_key попадают параметры запроса как есть, поэтому в ключ
+    идёт его хеш: длина и символы ключа не зависят от пользователя.
+    """
+    key = make_key('feed', get_generation(),
+                   hashlib.md5(page_key.encode()).hexdigest())
+    page = cache.get(key)
+    count_cache('feed', page is not None)
+    if page is not None:
+        return page
+    page = build()
+    cache.set(key, page, FEED_CACHE_TIMEOUT)
+    return page
+
+
+def stats():
+    """Попадания и промахи этого процесса и текущее поколение.
+
+    Счётчики живут в реестре метрик (/metrics), а не в общем кеше:
+    там каждый запрос ленты стоил бы лишней записи.
+    """
+    hits, misses = registry.cache_counts('feed')
+    return {
+        'hits': hits,
+        'misses': misses,
+        'generation': get_generation(),
+    }
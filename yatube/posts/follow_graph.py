@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import cached_property
+
+from core.metrics import count_cache
+
+from . import feed_cache
+from .models import Follow
+
+FOLLOWS_TIMEOUT = 60 * 60
+
+
+class FollowGraph:
+    """На кого подписан пользователь: id авторов одним множеством.
+
+    Множество загружается один раз и лежит в кеше под поколением
+    пользователя, которое меняют подписка и отписка. Проверка
+    «подписан ли на автора» после этого не стоит запросов.
+    """
+
+    def __init__(self, user):
+        self.user_id = user.pk
+
+    @cached_property
+    def author_ids(self):
+        if self.user_id is None:
+            return frozenset()
+        key = feed_cache.make_key(
+            'follows', self.user_id,
+            feed_cache.get_generation(
+                feed_cache.user_generation_key(self.user_id)
+            ),
+        )
+        ids = cache.get(key)
+        count_cache('follows', ids is not None)
+        if ids is None:
+            # Промах бывает сразу после подписки: реплика её ещё может
+            # не видеть, а кеш под новым поколением проживёт час.
+            # Основная база, а не db_for_write: чтение — не запись.
+            ids = frozenset(
+                Follow.objects.using(DEFAULT_DB_ALIAS).filter(
+                    user_id=self.user_id
+                ).values_list('author_id', flat=True)
+            )
+            cache.set(key, ids, FOLLOWS_TIMEOUT)
+        return ids
+
+    def __contains__(self, author):
+        return getattr(author, 'pk', author) in self.author_ids
+
+
+def for_request(request):
+    """Граф подписок зрителя, один на запрос."""
+    if not hasattr(request, '_follow_graph'):
+        request._follow_graph = FollowGraph(request.user)
+    return request._follow_graph
@@ -8,6 +8,16 @@ class PostForm(ModelForm):
 
         fields = ('group', 'text', 'image')
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field, message in self.upload_errors.items():
+            self.add_error(field, message)
+        return cleaned_data
+
 
 class CommentForm(ModelForm):
     class Meta:
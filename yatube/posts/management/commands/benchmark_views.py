@@ -0,0 +1,172 @@
+import json
+import os
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import (override_settings, setup_databases,
+                               teardown_databases)
+from django.utils import timezone
+
+from posts import benchmark
+from posts.models import Follow, Post, User
+
+BENCHMARK_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет отдельную базу синтетическими данными и замеряет '
+        'задержку, число запросов и память страниц posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--follows', type=int, default=50000)
+        parser.add_argument('--requests', type=int, default=30,
+                            help='Запросов на каждую страницу.')
+        parser.add_argument(
+            '--database', default=os.path.join(settings.BASE_DIR,
+                                               'benchmark.sqlite3'),
+            help='Файл базы для замеров; рабочая база не затрагивается.'
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не удалять базу после замеров и не заполнять её повторно.'
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не сбрасывать кеш перед каждым запросом.'
+        )
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument(
+            '--compare',
+            help='Файл прошлых результатов: упасть, если стало хуже.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=1.25,
+            help='Во сколько раз p50 может вырасти без ошибки.'
+        )
+        parser.add_argument(
+            '--concurrency', type=float, default=0, metavar='SECONDS',
+            help='Замерить чтения без записей и вместе с ними.'
+        )
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--tuned', action='store_true',
+            help='Открывать соединения с PRAGMA из SQLITE_TUNING.'
+        )
+
+    def handle(self, *args, **options):
+        connections['default'].settings_dict['TEST']['NAME'] = (
+            options['database']
+        )
+        pragmas = (settings.SQLITE_TUNING if options['tuned']
+                   else settings.SQLITE_PRAGMAS)
+        with override_settings(CACHES=BENCHMARK_CACHES, DEBUG=False,
+                               POSTS_THUMBNAIL_WORKERS=0,
+                               SQLITE_PRAGMAS=pragmas):
+            old_config = setup_databases(
+                verbosity=0, interactive=False, keepdb=options['keepdb']
+            )
+            try:
+                results = self.benchmark(options)
+            finally:
+                teardown_databases(old_config, verbosity=0,
+                                   keepdb=options['keepdb'])
+        with open(options['output'], 'w', encoding='utf-8') as stream:
+            json.dump(results, stream, ensure_ascii=False, indent=2)
+        self.report(results['views'])
+        if results['concurrency']:
+            self.report_concurrency(results['concurrency'])
+        if options['compare']:
+            self.compare(results['views'], options)
+
+    def benchmark(self, options):
+        seeded = None
+        if not Post.objects.exists():
+            started = time.perf_counter()
+            benchmark.seed(options['posts'], options['users'],
+                           options['follows'])
+            seeded = round(time.perf_counter() - started, 1)
+        return {
+            'commit': current_commit(),
+            'created': timezone.now().isoformat(),
+            'scale': {
+                'posts': Post.objects.count(),
+                'users': User.objects.count(),
+                'follows': Follow.objects.count(),
+                'seed_seconds': seeded,
+            },
+            'views': benchmark.run(
+                options['requests'],
+                None if options['warm'] else cache.clear,
+            ),
+            'concurrency': [
+                benchmark.concurrency(options['readers'], writers,
+                                      options['concurrency'])
+                for writers in (0, options['writers'])
+            ] if options['concurrency'] else [],
+        }
+
+    def report(self, views):
+        self.stdout.write(
+            f"{'view':<14}{'p50':>9}{'p90':>9}{'p99':>9}"
+            f"{'queries':>9}{'KiB':>10}"
+        )
+        for name, row in views.items():
+            self.stdout.write(
+                f"{name:<14}{row['p50_ms']:>9.2f}{row['p90_ms']:>9.2f}"
+                f"{row['p99_ms']:>9.2f}{row['queries']:>9}"
+                f"{row['peak_memory_kib']:>10.1f}"
+            )
+
+    def report_concurrency(self, rows):
+        self.stdout.write(
+            f"{'readers':>8}{'writers':>8}{'reads/s':>10}{'read p99':>10}"
+            f"{'writes/s':>10}{'errors':>8}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['readers']:>8}{row['writers']:>8}"
+                f"{row['reads_per_second']:>10}{row['reads_p99_ms']!s:>10}"
+                f"{row['writes_per_second']:>10}"
+                f"{row['reads_errors'] + row['writes_errors']:>8}"
+            )
+
+    def compare(self, views, options):
+        with open(options['compare'], encoding='utf-8') as stream:
+            previous = json.load(stream)['views']
+        regressions = []
+        for name, row in views.items():
+            before = previous.get(name)
+            if before is None:
+                continue
+            if row['queries'] > before['queries']:
+                regressions.append(
+                    f"{name}: запросов {before['queries']} → {row['queries']}"
+                )
+            if row['p50_ms'] > before['p50_ms'] * options['threshold']:
+                regressions.append(
+                    f"{name}: p50 {before['p50_ms']} → {row['p50_ms']} мс"
+                )
+        if regressions:
+            raise CommandError('Регрессии:\n' + '\n'.join(regressions))
+        self.stdout.write('Регрессий нет.')
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты и комментарии в NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?', default='-',
+            help='Файл для записи, по умолчанию stdout.'
+        )
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'),
+            help='Формат; по умолчанию по расширению файла.'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or (
+            'csv' if output.endswith('.csv') else 'ndjson'
+        )
+        write = transfer.write_csv if fmt == 'csv' else transfer.write_ndjson
+        if output == '-':
+            count = write(transfer.export_records(), sys.stdout)
+        else:
+            with open(output, 'w', encoding='utf-8', newline='') as stream:
+                count = write(transfer.export_records(), stream)
+        self.stderr.write(f'Выгружено записей: {count}')
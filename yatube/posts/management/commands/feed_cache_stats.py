@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed_cache
+
+
+class Command(BaseCommand):
+    help = 'Показывает поколение кеша страниц ленты.'
+
+    def handle(self, *args, **options):
+        # Попадания и промахи считает каждый воркер у себя, у команды
+        # они всегда нулевые.
+        self.stdout.write(
+            f'generation={feed_cache.stats()["generation"]} '
+            '(hits и misses: yatube_cache_requests_total{cache="feed"} '
+            'в /metrics)'
+        )
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, посты и комментарии из NDJSON или CSV '
+        'пачками через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', nargs='?', default='-',
+            help='Файл для чтения, по умолчанию stdin.'
+        )
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'),
+            help='Формат; по умолчанию по расширению файла.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE,
+            help='Сколько записей каждого вида писать за раз.'
+        )
+
+    def handle(self, *args, **options):
+        source = options['input']
+        fmt = options['format'] or (
+            'csv' if source.endswith('.csv') else 'ndjson'
+        )
+        read = transfer.read_csv if fmt == 'csv' else transfer.read_ndjson
+        importer = transfer.Importer(options['batch_size'])
+        if source == '-':
+            for line, record in read(sys.stdin):
+                importer.add(record, line)
+        else:
+            with open(source, encoding='utf-8', newline='') as stream:
+                for line, record in read(stream):
+                    importer.add(record, line)
+        counts = importer.finish()
+        self.stdout.write(
+            'Загружено: групп {group}, постов {post}, '
+            'комментариев {comment}'.format(**counts)
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import author_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает число постов, подписчиков и подписок авторов.'
+
+    def handle(self, *args, **options):
+        count = author_stats.rebuild()
+        self.stdout.write(f'Пересчитано пользователей: {count}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает популярных авторов и сверяет с ними ленты подписок.'
+
+    def handle(self, *args, **options):
+        ids = timeline.refresh_celebrities()
+        self.stdout.write(f'Популярных авторов: {len(ids)}')
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_image_blobs(apps, schema_editor):
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=name, refs=refs)
+        for name, refs in Post.objects.exclude(image='').order_by().values(
+            'image'
+        ).annotate(refs=Count('pk')).values_list('image', 'refs')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_authorstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.RunPython(fill_image_blobs, migrations.RunPython.noop),
+    ]
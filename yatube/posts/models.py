@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from core.models import CreatedModel
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -14,6 +16,26 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    FEED_FIELDS = (
+        'text',
+        'pub_date',
+        'image',
+        'comment_count',
+        'updated',
+        'version',
+        'author__username',
+        'author__first_name',
+        'author__last_name',
+        'group__title',
+        'group__slug',
+    )
+
+    def for_feed(self):
+        """Посты для ленты: автор и группа одним JOIN, лишние поля отложены."""
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+
 class Post(CreatedModel):
     text = models.TextField(
         'Текст поста',
@@ -41,17 +63,66 @@ class Post(CreatedModel):
     image = models.FileField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
+        db_index=True,
         blank=True
     )
+    comment_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    version = models.PositiveIntegerField(
+        'Версия',
+        default=1,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text[:15]
 
+    def save_new_version(self):
+        """Сохраняет правку и меняет версию, от которой зависят кеши.
+
+        Версия увеличивается отдельным UPDATE до save(), чтобы
+        обработчики post_save видели число, а не выражение F.
+        """
+        with transaction.atomic():
+            Post.objects.filter(pk=self.pk).update(
+                version=models.F('version') + 1
+            )
+            self.refresh_from_db(fields=('version',))
+            self.save()
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в ContentAddressedStorage и число ссылок на него."""
+    name = models.CharField('Имя файла', max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -76,6 +147,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created']
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -94,3 +169,60 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, которые сигналы обновляют при записи."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    post_count = models.PositiveIntegerField('Число постов', default=0)
+    follower_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
@@ -0,0 +1,206 @@
+import base64
+import json
+import math
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+# id в SQLite и bigint в других базах — знаковые 64 бита.
+MAX_PK = 2 ** 63 - 1
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(value, pk, reverse=False):
+    """Упаковывает позицию (значение ключа, id) в непрозрачный токен.
+
+    Значение ключа — дата или число (например, релевантность поиска).
+    """
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    payload = {'v': value, 'i': pk}
+    if reverse:
+        payload['r'] = 1
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, numeric=False):
+    """Разбирает токен encode_cursor.
+
+    numeric — ключ пагинатора числовой, иначе это дата; значение
+    другого типа делает курсор недействительным.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode())
+        value = payload['v']
+        if not numeric:
+            value = parse_datetime(value)
+        elif isinstance(value, bool) or not math.isfinite(value):
+            value = None
+        pk = int(payload['i'])
+    except (ValueError, TypeError, KeyError, AttributeError, OverflowError):
+        raise InvalidCursor(token)
+    if value is None or not -MAX_PK - 1 <= pk <= MAX_PK:
+        raise InvalidCursor(token)
+    return value, pk, bool(payload.get('r'))
+
+
+class CursorPage:
+    """Страница курсорной пагинации.
+
+    В отличие от django.core.paginator.Page не знает общего числа
+    объектов и номера страницы — только соседние курсоры.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage: {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def materialize(page):
+    """Готовит страницу к кешированию: только строки, без queryset.
+
+    У обычной django Page пагинатор держит весь queryset, и pickle
+    вычислил бы его целиком.
+    """
+    page.object_list = list(page.object_list)
+    paginator = getattr(page, 'paginator', None)
+    if paginator is not None:
+        # count и num_pages — cached_property: вычисляем их, пока у
+        # пагинатора ещё есть queryset, после него считать будет нечего.
+        paginator.num_pages
+        paginator.object_list = ()
+    return page
+
+
+class CursorPaginator:
+    """Keyset-пагинация по паре (field, tiebreak).
+
+    Каждая страница — один запрос с LIMIT per_page + 1 без OFFSET и
+    без COUNT(*), поэтому глубокие страницы стоят столько же,
+    сколько первая.
+    """
+    # Ключ — число, а не дата (см. decode_cursor).
+    numeric = False
+
+    def __init__(self, queryset, per_page, field='pub_date', descending=True,
+                 tiebreak='pk'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.descending = descending
+        self.tiebreak = tiebreak
+
+    def key(self, obj):
+        return getattr(obj, self.field), getattr(obj, self.tiebreak)
+
+    def _ordered(self, backwards):
+        desc = self.descending != backwards
+        prefix = '-' if desc else ''
+        return self.queryset.order_by(
+            f'{prefix}{self.field}', f'{prefix}{self.tiebreak}'
+        )
+
+    def _after(self, value, pk, backwards):
+        # (field, tiebreak) < (value, pk) записано как один диапазон по
+        # field, чтобы SQLite шёл по индексу, а не собирал MULTI-INDEX OR.
+        if self.descending != backwards:
+            bound, rest = 'lte', 'gte'
+        else:
+            bound, rest = 'gte', 'lte'
+        return (
+            Q(**{f'{self.field}__{bound}': value})
+            & ~Q(**{self.field: value, f'{self.tiebreak}__{rest}': pk})
+        )
+
+    def fetch(self, position, backwards, limit):
+        """Первые limit строк после позиции (value, pk) в нужную сторону."""
+        queryset = self._ordered(backwards)
+        if position is not None:
+            queryset = queryset.filter(self._after(*position, backwards))
+        return list(queryset[:limit])
+
+    def _cursor(self, obj, reverse=False):
+        return encode_cursor(*self.key(obj), reverse)
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу; битый курсор ведёт на первую страницу."""
+        position, backwards = None, False
+        if cursor:
+            try:
+                value, pk, backwards = decode_cursor(cursor, self.numeric)
+                position = value, pk
+            except InvalidCursor:
+                position = None
+        rows = self.fetch(position, backwards, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows)
+        if backwards:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor(rows[-1]) if has_next else None,
+            previous_cursor=(
+                self._cursor(rows[0], reverse=True) if has_previous else None
+            ),
+        )
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Сливает несколько курсорных источников с общим ключом.
+
+    Строки с одинаковым ключом (одна и та же запись из разных
+    источников) попадают на страницу один раз.
+    """
+
+    def __init__(self, paginators, per_page, descending=True):
+        self.paginators = paginators
+        self.per_page = per_page
+        self.descending = descending
+        self._keys = {}
+
+    def key(self, obj):
+        return self._keys[id(obj)]
+
+    def fetch(self, position, backwards, limit):
+        merged = {}
+        for paginator in self.paginators:
+            for row in paginator.fetch(position, backwards, limit):
+                merged.setdefault(paginator.key(row), row)
+        keys = sorted(merged, reverse=self.descending != backwards)[:limit]
+        self._keys = {id(merged[key]): key for key in keys}
+        return [merged[key] for key in keys]
@@ -0,0 +1,171 @@
+import re
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .paginators import CursorPaginator
+
+FTS_TABLE = 'posts_post_fts'
+
+Hit = namedtuple('Hit', 'rank pk')
+
+
+def terms(query):
+    """Слова запроса без служебного синтаксиса поисковых движков."""
+    return re.findall(r'\w+', query.lower())[:16]
+
+
+def attach_posts(page):
+    """Заменяет найденные id на посты ленты, сохраняя порядок."""
+    posts = Post.objects.for_feed().in_bulk([hit.pk for hit in page])
+    page.object_list = [posts[hit.pk] for hit in page if hit.pk in posts]
+    return page
+
+
+class SearchBackend(ABC):
+    @abstractmethod
+    def index(self, post):
+        """Добавляет или обновляет пост в индексе."""
+
+    @abstractmethod
+    def remove(self, post_id):
+        """Убирает пост из индекса."""
+
+    @abstractmethod
+    def rebuild(self):
+        """Строит индекс заново по всем постам."""
+
+    @abstractmethod
+    def get_page(self, query, per_page, cursor=None):
+        """Страница постов по запросу, лучшие совпадения первыми."""
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """Поиск перебором: без индекса, для баз без полнотекстового поиска.
+
+    Результаты не ранжируются, только по дате. iregex, а не icontains:
+    LIKE и LOWER в SQLite не знают регистра кириллицы, а REGEXP
+    Django выполняет через re.
+    """
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def get_page(self, query, per_page, cursor=None):
+        posts = Post.objects.for_feed()
+        for term in terms(query):
+            posts = posts.filter(text__iregex=re.escape(term))
+        return CursorPaginator(posts, per_page).get_page(cursor)
+
+
+class FTSPaginator(CursorPaginator):
+    """Keyset-пагинация по (bm25, rowid) прямо в таблице FTS5."""
+    numeric = True
+
+    def __init__(self, using, match, per_page):
+        self.using = using
+        self.match = match
+        self.per_page = per_page
+        self.descending = False
+
+    def key(self, hit):
+        return hit
+
+    def fetch(self, position, backwards, limit):
+        order = 'DESC' if backwards else 'ASC'
+        sql = f'SELECT rank, rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        params = [self.match]
+        if position is not None:
+            op = '<' if backwards else '>'
+            sql += f' AND (rank {op} %s OR (rank = %s AND rowid {op} %s))'
+            params += [position[0], position[0], position[1]]
+        sql += f' ORDER BY rank {order}, rowid {order} LIMIT %s'
+        params.append(limit)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [Hit(*row) for row in cursor.fetchall()]
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Инвертированный индекс SQLite FTS5, ранжирование по bm25.
+
+    Таблицу создаёт миграция posts; rowid в ней совпадает с id поста.
+    Запись в индекс идёт в базу, куда роутер пишет посты, поиск — в
+    ту, откуда их читает.
+    """
+
+    def __init__(self):
+        self._available = {}
+
+    def available(self, using):
+        if using not in self._available:
+            connection = connections[using]
+            self._available[using] = (
+                connection.vendor == 'sqlite'
+                and FTS_TABLE in connection.introspection.table_names()
+            )
+        return self._available[using]
+
+    def _writer(self):
+        using = router.db_for_write(Post)
+        return connections[using] if self.available(using) else None
+
+    def index(self, post):
+        connection = self._writer()
+        if connection is None:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text]
+            )
+
+    def remove(self, post_id):
+        connection = self._writer()
+        if connection is None:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post_id])
+
+    def rebuild(self):
+        connection = self._writer()
+        if connection is None:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}'
+            )
+
+    def get_page(self, query, per_page, cursor=None):
+        using = router.db_for_read(Post)
+        if not self.available(using):
+            return DatabaseSearchBackend().get_page(query, per_page, cursor)
+        match = ' '.join(f'"{term}"' for term in terms(query))
+        return attach_posts(
+            FTSPaginator(using, match, per_page).get_page(cursor)
+        )
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.POSTS_SEARCH_BACKEND)()
+    return _backend
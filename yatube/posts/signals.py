@@ -0,0 +1,157 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from sorl.thumbnail import delete as delete_thumbnails
+
+from core.sqlite import after_write, on_rollback
+
+from . import author_stats, feed_cache, thumbnails, timeline
+from .search import get_search_backend
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_feed_cache(sender, **kwargs):
+    feed_cache.bump_generation()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_name(sender, update_fields=None, **kwargs):
+    # Имя автора есть в карточках; вход в систему меняет только last_login.
+    if update_fields and not {
+        'username', 'first_name', 'last_name'
+    } & set(update_fields):
+        return
+    feed_cache.bump_generation()
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1
+    )
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    old_author_id = getattr(instance, '_old_author_id', None)
+    if created:
+        author_stats.bump(instance.author_id, 'post_count', 1)
+    elif old_author_id not in (None, instance.author_id):
+        author_stats.bump(old_author_id, 'post_count', -1)
+        author_stats.bump(instance.author_id, 'post_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    author_stats.bump(instance.author_id, 'post_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        author_stats.bump(instance.author_id, 'follower_count', 1)
+        author_stats.bump(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    author_stats.bump(instance.author_id, 'follower_count', -1)
+    author_stats.bump(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        after_write(timeline.fan_out, instance)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_user_pages(sender, instance, **kwargs):
+    feed_cache.bump_generation(
+        feed_cache.user_generation_key(instance.user_id)
+    )
+    # Профили обоих показывают числа подписчиков и подписок.
+    for user_id in (instance.user_id, instance.author_id):
+        feed_cache.bump_generation(feed_cache.author_generation_key(user_id))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
+
+
+def release_image(name):
+    """Удаляет картинку и её миниатюры, если на неё не ссылается ни один пост.
+
+    Файлы общие для постов с одинаковыми картинками, ссылки считает
+    ContentAddressedStorage.
+    """
+    storage = Post._meta.get_field('image').storage
+    if name and storage.release(name):
+        delete_thumbnails(thumbnails.source_image(name), delete_file=False)
+
+
+@receiver(pre_save, sender=Post)
+def keep_uncommitted_image(sender, instance, **kwargs):
+    # Откат попытки удаляет записанный файл, поэтому повтор должен
+    # сохранить загрузку заново, а не считать её уже сохранённой.
+    if instance.image and not instance.image._committed:
+        on_rollback(setattr, instance, 'image', instance.image.file)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_values(sender, instance, update_fields=None, **kwargs):
+    instance._old_image = instance._old_author_id = None
+    if instance.pk is None or (
+        update_fields and not {'image', 'author'} & set(update_fields)
+    ):
+        return
+    instance._old_image, instance._old_author_id = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('image', 'author_id').first() or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, **kwargs):
+    old = getattr(instance, '_old_image', None)
+    if old and old != instance.image.name:
+        transaction.on_commit(lambda: release_image(old))
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: release_image(name))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_search_backend().remove(instance.pk)
@@ -0,0 +1,109 @@
+import hashlib
+import os
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils.deconstruct import deconstructible
+
+from core.sqlite import on_rollback
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_digest(content):
+    """sha256 содержимого; загрузчик картинок считает его заранее."""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла — хеш содержимого.
+
+    Одинаковые картинки хранятся один раз: повторная загрузка
+    возвращает имя уже существующего файла. Каждое сохранение
+    увеличивает счётчик ссылок в ImageBlob, а удалять файл нужно
+    через release(), когда пост перестал на него ссылаться.
+    """
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        digest = content_digest(content)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        # Сначала ссылка, потом проверка файла: release() того же файла
+        # либо уже закончил и удалил его, либо ждёт нашей транзакции.
+        self.claim(name.replace('\\', '/'))
+        if self.exists(name):
+            return name
+        if hasattr(content, 'temporary_file_path'):
+            # Копия вместо переноса: после отката повтор сохранит
+            # загрузку ещё раз, и временный файл ему ещё нужен.
+            content = File(content.file, content.name)
+        name = super()._save(name, content)
+        on_rollback(self.discard, name)
+        return name
+
+    def discard(self, name):
+        """Удаляет файл неудавшегося сохранения, если на него не ссылаются."""
+        blob = apps.get_model('posts', 'ImageBlob')
+        post = apps.get_model('posts', 'Post')
+        if not (blob.objects.filter(name=name).exists()
+                or post.objects.filter(image=name).exists()):
+            self.delete(name)
+
+    def claim(self, name):
+        """Добавляет ссылку на файл в транзакции вызывающего.
+
+        Если пост так и не сохранится, откат вернёт и счётчик.
+        """
+        blob = apps.get_model('posts', 'ImageBlob')
+        _, created = blob.objects.get_or_create(name=name,
+                                                defaults={'refs': 1})
+        if not created:
+            blob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+    def release(self, name):
+        """Снимает ссылку и удаляет файл, если ссылок не осталось.
+
+        Первым идёт UPDATE счётчика: он ждёт незакоммиченный claim()
+        того же файла, так что файл не пропадёт из-под нового поста.
+        Посты, записанные в обход хранилища, тоже держат файл.
+        Возвращает True, если файл удалён.
+        """
+        blob = apps.get_model('posts', 'ImageBlob')
+        post = apps.get_model('posts', 'Post')
+        with transaction.atomic():
+            blob.objects.filter(name=name, refs__gt=0).update(
+                refs=F('refs') - 1
+            )
+            if (blob.objects.filter(name=name, refs__gt=0).exists()
+                    or post.objects.filter(image=name).exists()):
+                return False
+            blob.objects.filter(name=name).delete()
+            self.delete(name)
+        return True
+
+    def recount(self):
+        """Пересчитывает ссылки по таблице постов, например после импорта."""
+        blob = apps.get_model('posts', 'ImageBlob')
+        post = apps.get_model('posts', 'Post')
+        with transaction.atomic():
+            blob.objects.all().delete()
+            blob.objects.bulk_create(
+                blob(name=name, refs=refs)
+                for name, refs in post.objects.exclude(image='').order_by(
+                ).values('image').annotate(refs=Count('pk')).values_list(
+                    'image', 'refs'
+                )
+            )
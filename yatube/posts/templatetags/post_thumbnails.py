@@ -0,0 +1,20 @@
+from django import template
+from django.templatetags.static import static
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(image, geometry):
+    """URL готовой миниатюры или заглушки, пока миниатюра создаётся."""
+    if not image:
+        return ''
+    thumbnail = thumbnails.backend.get_ready_thumbnail(
+        image, geometry, **thumbnails.OPTIONS
+    )
+    if thumbnail is not None:
+        return thumbnail.url
+    thumbnails.schedule(image.name)
+    return static(thumbnails.PLACEHOLDER)
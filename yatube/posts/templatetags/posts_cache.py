@@ -0,0 +1,11 @@
+from django import template
+
+from posts import feed_cache
+
+register = template.Library()
+
+
+@register.simple_tag
+def cache_version():
+    """Версия формата кеша posts для ключей кешируемых фрагментов."""
+    return feed_cache.CACHE_VERSION
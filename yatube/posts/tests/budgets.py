@@ -0,0 +1,77 @@
+import os
+import time
+from collections import Counter, namedtuple
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+Budget = namedtuple('Budget', 'queries sql_ms render_ms')
+
+# Время рендера зависит от машины и её загрузки, поэтому проверяется
+# только по POSTS_BUDGET_RENDER=1, на стенде с предсказуемым железом.
+CHECK_RENDER = os.environ.get('POSTS_BUDGET_RENDER') == '1'
+
+
+class QueryLog:
+    """Запросы ко всем базам с временем выполнения каждого."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, (time.perf_counter() - started) * 1000)
+            )
+
+    @property
+    def sql_ms(self):
+        return sum(duration for _, duration in self.queries)
+
+    def report(self):
+        lines = [
+            f'{number:>3}. {duration:7.2f} мс  {sql}'
+            for number, (sql, duration) in enumerate(self.queries, 1)
+        ]
+        repeated = [
+            f'  x{count} {sql}'
+            for sql, count in Counter(sql for sql, _ in self.queries).items()
+            if count > 1
+        ]
+        if repeated:
+            lines += ['Повторяющиеся запросы (похоже на N+1):'] + repeated
+        return '\n'.join(lines)
+
+
+class BudgetMixin:
+    """Проверки бюджета страницы: число запросов, время SQL и рендера.
+
+    Рендер — всё время запроса за вычетом SQL, см. CHECK_RENDER.
+    При превышении тест падает со списком запросов, повторы собраны
+    отдельно.
+    """
+
+    @contextmanager
+    def assertBudget(self, queries=None, sql_ms=None, render_ms=None):
+        log = QueryLog()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            started = time.perf_counter()
+            yield log
+            total_ms = (time.perf_counter() - started) * 1000
+        render = total_ms - log.sql_ms
+        errors = []
+        if queries is not None and len(log.queries) > queries:
+            errors.append(f'запросов {len(log.queries)} > {queries}')
+        if sql_ms is not None and log.sql_ms > sql_ms:
+            errors.append(f'SQL {log.sql_ms:.1f} мс > {sql_ms} мс')
+        if CHECK_RENDER and render_ms is not None and render > render_ms:
+            errors.append(f'рендер {render:.1f} мс > {render_ms} мс')
+        if errors:
+            self.fail(
+                'Бюджет превышен: ' + ', '.join(errors) + '\n' + log.report()
+            )
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+
+def _bump(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {'KEY_PREFIX': 'test'})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_shared_between_instances(self):
+        """Запись одного процесса видна другому, удаление тоже."""
+        other = SQLiteCache(self.path, {'KEY_PREFIX': 'test'})
+        self.cache.set('page', {'posts': [1, 2]})
+        self.assertEqual(other.get('page'), {'posts': [1, 2]})
+        self.assertEqual(other.get_many(['page', 'nope']),
+                         {'page': {'posts': [1, 2]}})
+        other.delete('page')
+        self.assertIsNone(self.cache.get('page'))
+
+    def test_add_and_expiry(self):
+        """add не перезаписывает живой ключ, но занимает истёкший."""
+        self.assertTrue(self.cache.add('key', 1, 0.05))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 3))
+        self.assertEqual(self.cache.get('key'), 3)
+
+    def test_versions(self):
+        """Ключи разных версий не пересекаются."""
+        self.cache.set('key', 'old', version=1)
+        self.assertIsNone(self.cache.get('key', version=2))
+
+    def test_incr(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('counter')
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.get('counter'), 6)
+
+    def test_cull(self):
+        """Кеш не растёт больше MAX_ENTRIES."""
+        cache = SQLiteCache(self.path, {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2,
+                        'CULL_PROBABILITY': 1},
+        })
+        for i in range(30):
+            cache.set(f'key{i}', i)
+        count, = cache._db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        self.assertLessEqual(count, 11)
+        self.assertEqual(cache.get('key29'), 29)
+
+    @skipUnless(hasattr(os, 'fork'), 'нужен fork')
+    def test_incr_atomic_across_processes(self):
+        """Одновременные incr из разных процессов не теряются."""
+        SQLiteCache(self.path, {}).set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_bump, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(SQLiteCache(self.path, {}).get('counter'), 200)
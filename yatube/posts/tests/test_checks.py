@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.checks import check_performance_settings
+from core.middleware import GZipMiddleware
+from core.signals import apply_sqlite_pragmas
+
+CACHED_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [(
+            'django.template.loaders.cached.Loader',
+            settings.TEMPLATE_LOADERS,
+        )],
+    },
+}]
+
+
+def warning_ids():
+    return {warning.id for warning in check_performance_settings(None)}
+
+
+class PerformanceChecksTest(SimpleTestCase):
+    databases = {'default'}
+
+    def test_dev_profile_warns(self):
+        """Профиль разработки медленный, и проверка это видит."""
+        self.assertTrue({
+            'yatube.W002', 'yatube.W003', 'yatube.W006', 'yatube.W007',
+        } <= warning_ids())
+
+    @override_settings(
+        DEBUG=False,
+        TEMPLATES=CACHED_TEMPLATES,
+        SQLITE_PRAGMAS={'journal_mode': 'wal'},
+        SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+        MIDDLEWARE=['core.middleware.GZipMiddleware'],
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+    )
+    @mock.patch('core.staticfiles.brotli', object())
+    def test_prod_like_settings_pass(self):
+        # CONN_MAX_AGE у тестовых баз не переопределить.
+        self.assertEqual(warning_ids() - {'yatube.W003'}, set())
+        with self.settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}):
+            self.assertIn('yatube.W005', warning_ids())
+
+    @mock.patch('core.staticfiles.brotli', None)
+    def test_missing_brotli_warns(self):
+        self.assertIn('yatube.W009', warning_ids())
+
+    def test_sqlite_pragmas(self):
+        with self.settings(SQLITE_PRAGMAS={'cache_size': -4321}):
+            apply_sqlite_pragmas(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -4321)
+
+
+class GZipMiddlewareTest(SimpleTestCase):
+    def compress(self, content_type, status=200):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = HttpResponse(b'a' * 1000, content_type=content_type,
+                                status=status)
+        middleware = GZipMiddleware(lambda request: response)
+        return middleware(request).get('Content-Encoding')
+
+    def test_only_text_is_compressed(self):
+        self.assertEqual(self.compress('text/html; charset=utf-8'), 'gzip')
+        self.assertEqual(self.compress('image/svg+xml'), 'gzip')
+        self.assertIsNone(self.compress('image/jpeg'))
+        self.assertIsNone(self.compress('text/plain', status=206))
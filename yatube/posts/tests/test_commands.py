@@ -0,0 +1,175 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.template import engines
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.templates_warmup import warm_up
+from posts import benchmark
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          TimelineEntry, User)
+
+
+class TransferCommandsTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание')
+        self.post = Post.objects.create(author=author, group=group,
+                                        text='пост, с "кавычками"\nи строкой')
+        Post.objects.create(author=reader, text='без группы')
+        Comment.objects.create(post=self.post, author=reader,
+                               text='комментарий')
+        self.pub_date = self.post.pub_date
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def roundtrip(self, name):
+        path = os.path.join(self.dir, name)
+        call_command('export_posts', path, stderr=StringIO())
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        call_command('import_posts', path, batch_size=1, stdout=StringIO())
+
+    def test_roundtrip(self):
+        """Выгрузка и загрузка сохраняют данные и пересчитывают счётчики."""
+        for name in ('dump.ndjson', 'dump.csv'):
+            with self.subTest(format=name):
+                self.roundtrip(name)
+                post = Post.objects.select_related('author', 'group').get(
+                    pk=self.post.pk
+                )
+                self.assertEqual(post.text, self.post.text)
+                self.assertEqual(post.author.username, 'author')
+                self.assertEqual(post.group.slug, 'group')
+                self.assertEqual(post.pub_date, self.pub_date)
+                self.assertEqual(post.comment_count, 1)
+                self.assertEqual(Post.objects.count(), 2)
+                self.assertEqual(
+                    Post.objects.get(text='без группы').group, None
+                )
+                self.assertEqual(
+                    AuthorStats.objects.get(user=post.author).post_count, 1
+                )
+
+    def test_import_skips_existing(self):
+        """Повторная загрузка не дублирует посты и группы."""
+        path = os.path.join(self.dir, 'dump.ndjson')
+        call_command('export_posts', path, stderr=StringIO())
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comment_count, 1)
+
+    def test_comments_not_attached_to_foreign_post(self):
+        """Пост с чужим id не получает комментарии из файла."""
+        path = os.path.join(self.dir, 'dump.ndjson')
+        call_command('export_posts', path, stderr=StringIO())
+        Comment.objects.all().delete()
+        Post.objects.filter(pk=self.post.pk).update(
+            author=User.objects.get(username='reader')
+        )
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertFalse(Comment.objects.exists())
+
+    def test_import_unknown_model(self):
+        """Неизвестный вид записи — ошибка с номером строки."""
+        path = os.path.join(self.dir, 'dump.ndjson')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write('{"model": "group", "slug": "s", "title": "t"}\n\n')
+            stream.write('{"model": "user", "username": "x"}\n')
+        with self.assertRaisesMessage(CommandError, 'строка 3'):
+            call_command('import_posts', path, stdout=StringIO())
+
+    def test_import_rebuilds_timelines(self):
+        reader = User.objects.get(username='reader')
+        Follow.objects.create(user=reader, author=self.post.author)
+        TimelineEntry.objects.all().delete()
+        path = os.path.join(self.dir, 'dump.ndjson')
+        call_command('export_posts', path, stderr=StringIO())
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=reader).values_list(
+                'post_id', flat=True
+            )),
+            [self.post.pk],
+        )
+
+
+@override_settings(POSTS_THUMBNAIL_WORKERS=0)
+class BenchmarkTest(TestCase):
+    def test_seed_and_measure(self):
+        """Бенчмарк заполняет базу и замеряет каждую страницу."""
+        counts = benchmark.seed(posts=50, users=10, follows=20, groups=2)
+        self.assertEqual(counts['post'], 50)
+        self.assertEqual(Post.objects.count(), 50)
+        results = benchmark.run(requests=2)
+        self.assertEqual(
+            set(results),
+            {'index', 'index_deep', 'group_list', 'profile', 'post_detail',
+             'follow_index'},
+        )
+        for name, row in results.items():
+            with self.subTest(view=name):
+                self.assertGreater(row['queries'], 0)
+                self.assertGreaterEqual(row['p99_ms'], row['p50_ms'])
+
+
+def templates_setting(directory, cached=False):
+    loaders = ['django.template.loaders.filesystem.Loader']
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    return [{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [directory],
+        'OPTIONS': {'loaders': loaders},
+    }]
+
+
+class PrecompileTemplatesTest(SimpleTestCase):
+    def test_project_templates_compile(self):
+        out = StringIO()
+        call_command('precompile_templates', stdout=out)
+        count = sum(len(files) for _, _, files in os.walk(
+            os.path.join(settings.BASE_DIR, 'templates')
+        ))
+        self.assertIn(f'Скомпилировано шаблонов: {count}', out.getvalue())
+
+    def test_broken_templates_reported(self):
+        """Ошибка синтаксиса, include несуществующего шаблона, кодировка."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for name, text in (('ok.html', '{% include "broken.html" %}'),
+                           ('broken.html', '{% if %}'),
+                           ('missing.html', '{% include "nope.html" %}')):
+            with open(os.path.join(directory, name), 'w') as file:
+                file.write(text)
+        with open(os.path.join(directory, 'cp1251.html'), 'wb') as file:
+            file.write('Привет'.encode('cp1251'))
+        err = StringIO()
+        with override_settings(TEMPLATES=templates_setting(directory)):
+            with self.assertRaises(CommandError):
+                call_command('precompile_templates', stderr=err)
+        self.assertIn('broken.html', err.getvalue())
+        self.assertIn('missing.html: nope.html', err.getvalue())
+        self.assertIn('cp1251.html', err.getvalue())
+
+    def test_warm_up_fills_cached_loader(self):
+        directory = os.path.join(settings.BASE_DIR, 'templates')
+        with override_settings(
+            TEMPLATES=templates_setting(directory, cached=True)
+        ):
+            warm_up()
+            loader = engines['django'].engine.template_loaders[0]
+            self.assertIn('base.html', loader.get_template_cache)
+            self.assertIn('posts/includes/post_card.html',
+                          loader.get_template_cache)
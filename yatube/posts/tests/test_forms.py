@@ -1,16 +1,21 @@
+import hashlib
+import io
 import shutil
 import tempfile
 from django.conf import settings
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
-from posts.models import Group, Post, User, Comment
+from PIL import Image
+from posts.models import Group, ImageBlob, Post, User, Comment
+from posts.signals import release_image
+from posts.uploadhandlers import MAX_HEADER_SIZE
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
 class PostFormsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -67,8 +72,88 @@ class PostFormsTest(TestCase):
         self.assertEqual(Post.objects.count(), posts_count + 1)
         self.assertTrue(Post.objects.filter(text='текст',
                                             author=self.author).exists())
+        digest = hashlib.sha256(self.gif).hexdigest()
         self.assertEqual(response.context['page_obj'].object_list[0].image,
-                         'posts/small.gif')
+                         f'posts/{digest[:2]}/{digest}.gif')
+
+    def test_create_post_with_large_jpeg_header(self):
+        """JPEG с ICC-профилем больше MAX_HEADER_SIZE принимается."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (3, 2)).save(
+            buffer, 'JPEG', icc_profile=b'\x00' * (MAX_HEADER_SIZE + 5000)
+        )
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'большой заголовок',
+                'image': SimpleUploadedFile('icc.jpg', buffer.getvalue()),
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(text='большой заголовок')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+    def test_same_image_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом до последней ссылки."""
+        for text in ('первый', 'второй'):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={
+                    'text': text,
+                    'image': SimpleUploadedFile('copy.gif', self.gif),
+                },
+            )
+        first, second = Post.objects.filter(text__in=('первый', 'второй'))
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+        name = first.image.name
+        first.delete()
+        release_image(name)
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        release_image(name)
+        self.assertFalse(storage.exists(name))
+
+    def test_release_waits_for_new_reference(self):
+        """Файл, который уже взял новый пост, не удаляется со старым."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'старый',
+                  'image': SimpleUploadedFile('old.gif', self.gif)},
+        )
+        old = Post.objects.get(text='старый')
+        storage = old.image.storage
+        name = old.image.name
+        # Новый пост уже сохранил файл, но ещё не записан в базу.
+        storage.claim(name)
+        old.delete()
+        release_image(name)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 1)
+
+    def test_create_post_rejects_bad_image(self):
+        """Не картинка, огромное разрешение и большой файл отклоняются."""
+        huge = self.gif[:6] + b'\xff\xff\xff\xff' + self.gif[10:]
+        files = {
+            'not an image': b'<?php echo 1; ?>' * 4,
+            'too many pixels': huge,
+            'too large': self.gif + b'\x00' * 64,
+        }
+        posts_count = Post.objects.count()
+        for case, content in files.items():
+            with self.subTest(case=case), self.settings(
+                POSTS_IMAGE_MAX_SIZE=len(self.gif) + 32
+            ):
+                response = self.authorized_client.post(
+                    reverse('posts:post_create'),
+                    data={
+                        'text': 'текст',
+                        'image': SimpleUploadedFile('x.gif', content),
+                    },
+                )
+                self.assertIn('image', response.context['form'].errors)
+                self.assertEqual(Post.objects.count(), posts_count)
 
     def test_edit_post(self):
         """Валидная форма редактировани поста."""
@@ -123,4 +208,17 @@ class PostFormsTest(TestCase):
         )
         self.assertRedirects(response, reverse((
             'posts:post_detail'), kwargs={'post_id': f'{self.post.id}'}))
-        self.assertEqual(Comment.objects.count(), comments_count + 1)
\ No newline at end of file
+        self.assertEqual(Comment.objects.count(), comments_count + 1)
+
+    def test_comment_updates_count(self):
+        """Счётчик комментариев поста растёт и уменьшается."""
+        count = Post.objects.get(pk=self.post.pk).comment_count
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Ещё комментарий'},
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, count + 1)
+        Comment.objects.filter(text='Ещё комментарий').delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, count)
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from core.media import IMMUTABLE, REVALIDATE, parse_range
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+DIGEST = 'ab' * 32
+CONTENT = bytes(range(256)) * 4
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SENDFILE='')
+class MediaServeTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (f'posts/ab/{DIGEST}.jpg', 'cache/12/34/thumb.jpg',
+                     'posts/old.jpg'):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+        cls.url = f'/media/posts/ab/{DIGEST}.jpg'
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_full_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_cache_control(self):
+        """Миниатюры и файлы с хешем в имени кешируются навсегда."""
+        cases = {
+            self.url: IMMUTABLE,
+            '/media/cache/12/34/thumb.jpg': IMMUTABLE,
+            '/media/posts/old.jpg': REVALIDATE,
+        }
+        for url, expected in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url)['Cache-Control'], expected
+                )
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content),
+                         CONTENT[10:20])
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 10-19/{len(CONTENT)}')
+        response = self.client.head(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Length'], '10')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'],
+                         f'bytes */{len(CONTENT)}')
+
+    def test_if_range_and_etag(self):
+        """Устаревший If-Range даёт файл целиком, свежий ETag — 304."""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                                   HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_and_outside_root(self):
+        for url in ('/media/posts/nope.jpg', '/media/posts/',
+                    '/media/../manage.py'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_sendfile_handoff(self):
+        """Фронтенду уходит только заголовок, тело пустое."""
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected-media/posts/ab/{DIGEST}.jpg')
+        self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(TEMP_MEDIA_ROOT, 'posts', 'ab', f'{DIGEST}.jpg'),
+        )
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=-100', 1024), (924, 1023))
+        self.assertEqual(parse_range('bytes=1000-2000', 1024), (1000, 1023))
+        self.assertIsNone(parse_range('bytes=0-1,5-9', 1024))
+        self.assertIs(parse_range('bytes=9-1', 1024), False)
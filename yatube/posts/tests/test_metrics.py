@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import registry
+from posts.models import Post, User
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='author')
+        Post.objects.create(author=user, text='пост')
+        self.client = Client()
+        registry.reset()
+        cache.clear()
+
+    def get_metrics(self):
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_metrics_endpoint(self):
+        """После запроса страницы её метрики видны в /metrics."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        metrics = self.get_metrics()
+        expected = [
+            'yatube_requests_total{view="posts:index",status="2xx"} 2',
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            'yatube_cache_requests_total{cache="feed",result="hit"} 1',
+            'yatube_cache_requests_total{cache="feed",result="miss"} 1',
+        ]
+        for line in expected:
+            with self.subTest(line=line):
+                self.assertIn(line, metrics)
+        self.assertRegex(
+            metrics, r'yatube_db_queries_total\{view="posts:index"\} [1-9]'
+        )
+        self.assertRegex(
+            metrics,
+            r'yatube_template_render_seconds_total\{view="posts:index"\} '
+            r'0\.\d*[1-9]'
+        )
+
+    def test_metrics_require_token(self):
+        """Без токена /metrics не виден."""
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(headers=headers):
+                response = self.client.get(reverse('metrics'), **headers)
+                self.assertEqual(response.status_code, 404)
+        with self.settings(METRICS_TOKEN=''):
+            response = self.client.get(reverse('metrics'),
+                                       HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0,
+                       METRICS_TRACE_SAMPLE_RATE=1)
+    def test_slow_request_traced(self):
+        """Медленный запрос попадает в лог вместе со своими запросами."""
+        with self.assertLogs('yatube.slow_requests') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
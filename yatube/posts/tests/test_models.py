@@ -1,6 +1,14 @@
+import re
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_save
 from django.test import TestCase
 
-from posts.models import Group, Post, User
+from posts.models import AuthorStats, Follow, Group, Post, User
+from posts.paginators import CursorPaginator
 
 
 class PostModelTest(TestCase):
@@ -28,6 +36,22 @@ class PostModelTest(TestCase):
         exp_group = group.title
         self.assertEqual(exp_group, str(group))
 
+    def test_save_new_version(self):
+        """Обработчики post_save видят новую версию числом."""
+        seen = []
+
+        def receiver(sender, instance, **kwargs):
+            seen.append(instance.version)
+
+        post_save.connect(receiver, sender=Post)
+        try:
+            post = Post.objects.get(pk=self.post.pk)
+            post.save_new_version()
+        finally:
+            post_save.disconnect(receiver, sender=Post)
+        self.assertEqual(seen, [self.post.version + 1])
+        self.assertEqual(post.version, self.post.version + 1)
+
     def test_post_model_verbose(self):
         '''Проверяем поле verbose.'''
         post = self.post
@@ -51,3 +75,95 @@ class PostModelTest(TestCase):
         for field, text in fields.items():
             with self.subTest():
                 self.assertEqual(field, text)
+
+
+class AuthorStatsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+
+    def counts(self, user):
+        stats = AuthorStats.objects.get(user=user)
+        return stats.post_count, stats.follower_count, stats.following_count
+
+    def test_counts_follow_writes(self):
+        """Счётчики меняются вместе с постами и подписками."""
+        post = Post.objects.create(author=self.author, text='пост')
+        Post.objects.create(author=self.author, text='ещё пост')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counts(self.author), (2, 1, 0))
+        self.assertEqual(self.counts(self.reader), (0, 0, 1))
+        post.author = self.reader
+        post.save()
+        self.assertEqual(self.counts(self.author), (1, 1, 0))
+        self.assertEqual(self.counts(self.reader), (1, 0, 1))
+        post.delete()
+        follow.delete()
+        self.assertEqual(self.counts(self.author), (1, 0, 0))
+        self.assertEqual(self.counts(self.reader), (0, 0, 0))
+
+    def test_rebuild_command(self):
+        """rebuild_author_stats пересчитывает счётчики по таблицам."""
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'пост {i}') for i in range(3)
+        ])
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.filter(user=self.reader).delete()
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(self.counts(self.author), (3, 1, 0))
+        self.assertEqual(self.counts(self.reader), (0, 0, 1))
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTest(TestCase):
+    FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='plan')
+        cls.group = Group.objects.create(title='группа', slug='plan')
+        cls.post = Post.objects.create(author=cls.user, text='пост',
+                                       group=cls.group)
+
+    def feed_queries(self):
+        feeds = {
+            'index': Post.objects.for_feed(),
+            'group': self.group.posts.for_feed(),
+            'profile': self.user.posts.for_feed(),
+            'timeline': self.user.timeline.all(),
+        }
+        queries = {}
+        for name, queryset in feeds.items():
+            tiebreak = 'post_id' if name == 'timeline' else 'pk'
+            paginator = CursorPaginator(queryset, 10, tiebreak=tiebreak)
+            queries[name] = paginator._ordered(False)[:11]
+            queries[f'{name} cursor'] = paginator._ordered(False).filter(
+                paginator._after(self.post.pub_date, self.post.pk, False)
+            )[:11]
+        comments = CursorPaginator(self.post.comments.all(), 10,
+                                   field='created', descending=False)
+        queries['comments'] = comments._ordered(False)[:11]
+        queries['follow'] = Follow.objects.filter(user=self.user,
+                                                  author=self.user)
+        return queries
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не сканируют таблицы целиком и не сортируют."""
+        for name, queryset in self.feed_queries().items():
+            with self.subTest(query=name):
+                plan = explain(queryset)
+                self.assertFalse(
+                    [step for step in plan if self.FULL_SCAN.match(step)],
+                    plan
+                )
+                self.assertFalse(
+                    [step for step in plan if 'TEMP B-TREE' in step], plan
+                )
@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import Client, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.routers import STICKY_COOKIE, use_replica
+from posts.models import Group, Post, User
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        self.user = User.objects.create(username='reader')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.post = Post.objects.create(author=self.user, text='пост',
+                                        group=self.group)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(replica)
+
+    def test_reads_go_to_replica(self):
+        """Страницы чтения обращаются к реплике."""
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        ]
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertGreater(self.get(page), 0)
+
+    def test_sticky_after_write(self):
+        """После записи пользователь какое-то время читает из default."""
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'комментарий'},
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(
+            self.get(reverse('posts:post_detail',
+                             kwargs={'post_id': self.post.id})),
+            0,
+        )
+
+    def test_sticky_after_write_on_get(self):
+        """Подписка по ссылке — тоже запись."""
+        author = User.objects.create(username='author')
+        response = self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': author})
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_follows_read_from_default(self):
+        """Подписки под новым поколением не берутся из отстающей реплики."""
+        cache.clear()
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            self.get(reverse('posts:profile', kwargs={'username': self.user}))
+        self.assertFalse(any('posts_follow' in query['sql']
+                             for query in replica.captured_queries))
+
+    def test_transaction_reads_default(self):
+        """Внутри транзакции чтения идут в default."""
+        with use_replica():
+            self.assertEqual(Post.objects.all().db, 'replica1')
+            with transaction.atomic():
+                self.assertEqual(Post.objects.all().db, 'default')
+        self.assertEqual(Post.objects.all().db, 'default')
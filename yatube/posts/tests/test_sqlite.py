@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from unittest import skipUnless
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core import sqlite
+from posts.models import Comment, ImageBlob, Post, User
+
+LOCK_PATH = os.path.join(tempfile.gettempdir(), 'yatube-test-write.lock')
+GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C\x0A\x00\x3B'
+)
+
+
+def _hold_lock(ready, seconds):
+    with override_settings(SQLITE_WRITE_LOCK=LOCK_PATH):
+        with sqlite.write_lock():
+            ready.set()
+            time.sleep(seconds)
+
+
+@override_settings(SQLITE_WRITE_LOCK=LOCK_PATH, SQLITE_WRITE_BACKOFF=0)
+class SerializedWritesTest(TransactionTestCase):
+    def test_retries_locked_database(self):
+        """Блокировку пережидают, остальные ошибки не глушат."""
+        attempts = []
+
+        def write():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(sqlite.run_serialized(write), 'ok')
+        self.assertEqual(len(attempts), 3)
+
+        def broken():
+            attempts.append(1)
+            raise OperationalError('no such table: nope')
+
+        attempts.clear()
+        with self.assertRaises(OperationalError):
+            sqlite.run_serialized(broken)
+        self.assertEqual(len(attempts), 1)
+
+    def test_is_locked(self):
+        for message, locked in (
+            ('database is locked', True),
+            ('database table is locked', True),
+            ('no such table: busy_signals', False),
+        ):
+            with self.subTest(message=message):
+                self.assertIs(
+                    sqlite.is_locked(OperationalError(message)), locked
+                )
+
+    def test_deferred_after_successful_attempt(self):
+        """Отложенное выполняется один раз и после снятия блокировки."""
+        attempts, calls = [], []
+
+        def write():
+            attempts.append(1)
+            sqlite.after_write(calls.append, len(attempts))
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+
+        sqlite.run_serialized(write)
+        self.assertEqual(calls, [2])
+
+    def test_failed_attempt_removes_new_files(self):
+        storage = Post._meta.get_field('image').storage
+        names = []
+
+        def write():
+            names.append(storage.save('posts/a.txt', ContentFile(b'a')))
+            raise OperationalError('no such table: nope')
+
+        with tempfile.TemporaryDirectory() as root:
+            with self.settings(MEDIA_ROOT=root):
+                with self.assertRaises(OperationalError):
+                    sqlite.run_serialized(write)
+                self.assertFalse(storage.exists(names[0]))
+
+    def test_gives_up_after_retries(self):
+        def locked():
+            raise OperationalError('database is locked')
+
+        with self.settings(SQLITE_WRITE_RETRIES=2):
+            with self.assertRaises(OperationalError):
+                sqlite.run_serialized(locked)
+
+    def test_rolls_back_failed_attempt(self):
+        user = User.objects.create(username='author')
+        attempts = []
+
+        def write():
+            Post.objects.create(author=user, text='пост')
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+
+        sqlite.run_serialized(write)
+        self.assertEqual(Post.objects.count(), 1)
+
+    @skipUnless(sqlite.fcntl and hasattr(os, 'fork'), 'нужны fcntl и fork')
+    def test_lock_across_processes(self):
+        """Второй процесс ждёт, пока первый допишет."""
+        context = multiprocessing.get_context('fork')
+        ready = context.Event()
+        process = context.Process(target=_hold_lock, args=(ready, 0.3))
+        process.start()
+        ready.wait(5)
+        started = time.perf_counter()
+        with sqlite.write_lock():
+            waited = time.perf_counter() - started
+        process.join()
+        self.assertGreater(waited, 0.1)
+
+    def test_retried_upload_keeps_image(self):
+        """Повтор после блокировки заново сохраняет картинку поста."""
+        user = User.objects.create(username='author')
+        client = Client()
+        client.force_login(user)
+        failures = []
+
+        def lock_first_insert(execute, sql, params, many, context):
+            if sql.startswith('INSERT INTO "posts_post"') and not failures:
+                failures.append(sql)
+                raise OperationalError('database is locked')
+            return execute(sql, params, many, context)
+
+        with tempfile.TemporaryDirectory() as root:
+            with self.settings(MEDIA_ROOT=root, POSTS_THUMBNAIL_WORKERS=0):
+                with connection.execute_wrapper(lock_first_insert):
+                    response = client.post(reverse('posts:post_create'), {
+                        'text': 'пост',
+                        'image': SimpleUploadedFile('small.gif', GIF,
+                                                    'image/gif'),
+                    })
+                self.assertEqual(response.status_code, 302)
+                self.assertEqual(len(failures), 1)
+                post = Post.objects.get()
+                self.assertTrue(post.image.storage.exists(post.image.name))
+                self.assertEqual(
+                    ImageBlob.objects.get(name=post.image.name).refs, 1
+                )
+
+    def test_views_write_through_lock(self):
+        user = User.objects.create(username='reader')
+        post = Post.objects.create(author=user, text='пост')
+        client = Client()
+        client.force_login(user)
+        response = client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'комментарий'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Comment.objects.filter(post=post).exists())
@@ -0,0 +1,107 @@
+import gzip
+import os
+import shutil
+import tempfile
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import SimpleTestCase, override_settings
+
+from core.staticfiles import StaticFilesApp, accepted_encodings
+
+TEMP_STATIC_ROOT = tempfile.mkdtemp()
+
+
+def django_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'django']
+
+
+@override_settings(STATIC_ROOT=TEMP_STATIC_ROOT)
+class StaticFilesTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.app = StaticFilesApp(django_app)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_STATIC_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def get(self, path, **headers):
+        environ = {'PATH_INFO': path, **headers}
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = status
+            response['headers'] = dict(headers)
+
+        body = b''.join(self.app(environ, start_response))
+        return response['status'], response['headers'], body
+
+    def test_static_tag_uses_hashed_names(self):
+        """{% static %} ведёт на файл с хешем, рядом лежит .gz."""
+        url = static('css/bootstrap.min.css')
+        self.assertRegex(
+            url, r'^/static/css/bootstrap\.min\.[0-9a-f]{12}\.css$'
+        )
+        path = os.path.join(TEMP_STATIC_ROOT, url[len('/static/'):])
+        self.assertTrue(os.path.exists(path + '.gz'))
+        self.assertFalse(os.path.exists(
+            os.path.join(TEMP_STATIC_ROOT, 'img', 'logo.png.gz')
+        ))
+
+    def test_encoding_negotiation(self):
+        """Сжатая копия отдаётся только тем, кто её принимает."""
+        url = static('css/bootstrap.min.css')
+        status, headers, body = self.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(headers['Content-Type'], 'text/css')
+        self.assertIn('immutable', headers['Cache-Control'])
+        _, plain_headers, plain = self.get(
+            url, HTTP_ACCEPT_ENCODING='gzip;q=0'
+        )
+        self.assertNotIn('Content-Encoding', plain_headers)
+        self.assertEqual(gzip.decompress(body), plain)
+        self.assertNotEqual(headers['ETag'], plain_headers['ETag'])
+        status, _, _ = self.get(url, HTTP_IF_NONE_MATCH=headers['ETag'])
+        self.assertEqual(status, '200 OK')
+
+    def test_unhashed_name_and_revalidation(self):
+        """Имя без хеша кешируется ненадолго, ETag даёт 304."""
+        status, headers, _ = self.get('/static/img/logo.png')
+        self.assertEqual(status, '200 OK')
+        self.assertNotIn('immutable', headers['Cache-Control'])
+        status, _, body = self.get(
+            '/static/img/logo.png', HTTP_IF_NONE_MATCH=headers['ETag']
+        )
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(body, b'')
+        for header in ('"other", W/' + headers['ETag'], '*'):
+            with self.subTest(header=header):
+                status, _, _ = self.get('/static/img/logo.png',
+                                        HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(status, '304 Not Modified')
+
+    def test_head_and_passthrough(self):
+        """HEAD без тела, остальные пути уходят в Django."""
+        _, headers, body = self.get(static('img/logo.png'),
+                                    REQUEST_METHOD='HEAD')
+        self.assertEqual(body, b'')
+        self.assertNotEqual(headers['Content-Length'], '0')
+        self.assertEqual(self.get('/static/missing.css')[2], b'django')
+        self.assertEqual(self.get('/')[2], b'django')
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip, deflate, br;q=0.5'),
+                         {'gzip', 'deflate', 'br'})
+        self.assertEqual(accepted_encodings('br;q=0, gzip'), {'gzip'})
+        self.assertEqual(accepted_encodings('gzip;q=abc, br ; q = 0'),
+                         {'gzip'})
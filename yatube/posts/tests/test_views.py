@@ -3,18 +3,51 @@ from django.urls import reverse
 from django import forms
 from django.conf import settings
 import tempfile
+from io import StringIO
+import warnings
 import shutil
+from datetime import timedelta
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest import mock
 
-from posts.models import Post, Group, User
+from core.metrics import registry
+from posts import feed_cache, thumbnails, timeline
+from posts.models import Comment, Follow, Post, Group, User
+from posts.paginators import encode_cursor
+from posts.search import DatabaseSearchBackend
+from posts.urls import urlpatterns
+from posts.views import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+
+from .budgets import Budget, BudgetMixin
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
+# Два запроса на каждой странице — сессия и пользователь.
+PAGE_BUDGETS = {
+    'index': Budget(queries=4, sql_ms=50, render_ms=300),
+    'group_list': Budget(queries=5, sql_ms=50, render_ms=300),
+    'profile': Budget(queries=6, sql_ms=50, render_ms=300),
+    'post_detail': Budget(queries=5, sql_ms=50, render_ms=300),
+    'post_create': Budget(queries=9, sql_ms=20, render_ms=200),
+    'post_edit': Budget(queries=4, sql_ms=20, render_ms=200),
+    'add_comment': Budget(queries=5, sql_ms=20, render_ms=100),
+    'follow_index': Budget(queries=5, sql_ms=50, render_ms=300),
+    'search': Budget(queries=5, sql_ms=50, render_ms=300),
+    # Подписка: счётчики обоих пользователей, лента, пересчёт знаменитостей.
+    'profile_follow': Budget(queries=16, sql_ms=20, render_ms=100),
+    'profile_unfollow': Budget(queries=8, sql_ms=20, render_ms=100),
+}
+
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class PostPagesTests(TestCase):
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class PostPagesTests(BudgetMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -76,6 +109,55 @@ class PostPagesTests(TestCase):
                     response = self.authorized_client.get(reverse_name)
                     self.assertTemplateUsed(response, template)
 
+    def budget_pages(self):
+        """URL и данные POST (None — GET) для каждой страницы."""
+        post = {'post_id': self.post.id}
+        author = {'username': self.user.username}
+        # Подписка на себя ничего не пишет: бюджет — для чужого автора.
+        other = {'username': User.objects.create(username='other').username}
+        return {
+            'index': (reverse('posts:index'), None),
+            'group_list': (reverse('posts:group_list',
+                                   kwargs={'slug': self.group.slug}), None),
+            'profile': (reverse('posts:profile', kwargs=author), None),
+            'post_detail': (reverse('posts:post_detail', kwargs=post), None),
+            'post_create': (reverse('posts:post_create'),
+                            {'text': 'новый пост'}),
+            'post_edit': (reverse('posts:post_edit', kwargs=post), None),
+            'add_comment': (reverse('posts:add_comment', kwargs=post),
+                            {'text': 'комментарий'}),
+            'follow_index': (reverse('posts:follow_index'), None),
+            'search': (reverse('posts:search') + '?q=текст', None),
+            # Порядок важен: отписка удаляет подписку, созданную выше.
+            'profile_follow': (reverse('posts:profile_follow',
+                                       kwargs=other), None),
+            'profile_unfollow': (reverse('posts:profile_unfollow',
+                                         kwargs=other), None),
+        }
+
+    def test_pages_within_budget(self):
+        """Каждая страница posts укладывается в свой бюджет."""
+        pages = self.budget_pages()
+        self.assertEqual(
+            set(pages), {pattern.name for pattern in urlpatterns},
+            'Для нового URL нужен бюджет.'
+        )
+        for name, (url, data) in pages.items():
+            with self.subTest(page=name):
+                if data is None and name not in ('profile_follow',
+                                                 'profile_unfollow'):
+                    # Первый показ создаёт миниатюры, бюджет — для
+                    # следующих.
+                    self.authorized_client.get(url)
+                cache.clear()
+                with self.assertBudget(*PAGE_BUDGETS[name]):
+                    if data is None:
+                        self.authorized_client.get(url)
+                    else:
+                        response = self.authorized_client.post(url, data)
+                        # Бюджет записи, а не формы с ошибками.
+                        self.assertEqual(response.status_code, 302)
+
     def test_index_show_correct_context(self):
         """Тест контекста для index."""
         response = self.authorized_client.get(reverse('posts:index'))
@@ -115,6 +197,42 @@ class PostPagesTests(TestCase):
                          self.post.author.posts.count())
         self.assertEqual(first_object.image, self.post.image)
 
+    def test_detail_comments_scoped(self):
+        """На странице поста только его комментарии, постранично."""
+        other = Post.objects.create(author=self.user, text='другой')
+        Comment.objects.create(post=other, author=self.user, text='чужой')
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.user, text=f'к {i}')
+            for i in range(COMMENTS_PER_PAGE + 1)
+        ])
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        comments = self.client.get(url).context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(all(c.post_id == self.post.id for c in comments))
+        rest = self.client.get(url, {'cursor': comments.next_cursor})
+        self.assertEqual(len(rest.context['comments']), 1)
+
+    def test_thumbnail_placeholder(self):
+        """Пока миниатюра создаётся, лента отдаёт заглушку."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnails.PLACEHOLDER)
+        # Готовые миниатюры сами сбрасывают закешированную страницу.
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, thumbnails.PLACEHOLDER)
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    def test_thumbnail_ready_written_through_lock(self):
+        """Отметка готовых миниатюр пишет под блокировкой, сбой — в лог."""
+        name = self.post.image.name
+        with mock.patch.object(thumbnails, 'serialized_write') as write:
+            thumbnails.generate(name)
+        write.assert_called_once_with(thumbnails.ready, name)
+        locked = OperationalError('database is locked')
+        with mock.patch.object(thumbnails, 'ready', side_effect=locked):
+            with self.assertLogs('posts.thumbnails') as logs:
+                thumbnails.generate(name)
+        self.assertIn(name, logs.output[0])
+
     def test_create_show_correct_context(self):
         """Тест контекста для create."""
         response = self.authorized_client.get(reverse('posts:post_create'))
@@ -156,17 +274,404 @@ class PostPagesTests(TestCase):
                                  self.post, f'{self.post.id}')
 
     def test_index_cache_context(self):
-        """Тест кеширования главной страницы"""
+        """Кеш главной страницы сбрасывается при изменении постов."""
         response = self.client.get(reverse('posts:index'))
         self.assertEqual(len(response.context['page_obj']), 1)
         post = Post.objects.create(
             author=self.user,
             text='Текст поста в кеше',)
         response = self.client.get(reverse('posts:index'))
-        self.assertEqual(len(response.context['page_obj']), 1)
+        self.assertEqual(len(response.context['page_obj']), 2)
         post.delete()
         response = self.client.get(reverse('posts:index'))
         self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_post_card_cached_by_version(self):
+        """Карточка поста берётся из кеша, пока не сменится версия."""
+        # Первый показ ставит миниатюру в очередь, второй кеширует карточку.
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='тайком')
+        feed_cache.bump_generation()
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'тайком')
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'открыто', 'group': self.group.id},
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'открыто')
+
+    def test_post_card_follows_author_and_group(self):
+        """Новое имя автора и новый адрес группы сразу видны в карточке."""
+        thumbnails.generate(self.post.image.name)
+        self.client.get(reverse('posts:index'))
+        self.user.first_name, self.user.last_name = 'Новое', 'Имя'
+        self.user.save()
+        self.group.slug = 'new-slug'
+        self.group.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новое Имя')
+        self.assertContains(response, '/group/new-slug/')
+
+    def test_conditional_get(self):
+        """Повторный запрос с If-None-Match получает 304 до изменений."""
+        thumbnails.generate(self.post.image.name)
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                etag = response['ETag']
+                self.assertTrue(response.has_header('Last-Modified'))
+                response = self.authorized_client.get(
+                    page, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 304)
+                self.authorized_client.post(
+                    reverse('posts:add_comment',
+                            kwargs={'post_id': self.post.id}),
+                    data={'text': f'комментарий к {page}'},
+                )
+                response = self.authorized_client.get(
+                    page, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_per_user(self):
+        """ETag ленты зависит от зрителя."""
+        page = reverse('posts:index')
+        etag = self.client.get(page)['ETag']
+        response = self.authorized_client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_index_cache_odd_cursor(self):
+        """Курсор из запроса не ломает ключ кеша."""
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            response = self.client.get(reverse('posts:index'),
+                                       {'cursor': 'пробел и\n' * 50})
+        self.assertEqual(response.status_code, 200)
+
+    def test_index_cache_stats(self):
+        """Повторный запрос главной страницы попадает в кеш."""
+        thumbnails.generate(self.post.image.name)
+        registry.reset()
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        stats = feed_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+
+class PaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='paginator')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='paginator-slug'
+        )
+        Post.objects.bulk_create([
+            Post(author=cls.user, text=f'пост {i}', group=cls.group)
+            for i in range(POSTS_PER_PAGE + 3)
+        ])
+
+    def setUp(self):
+        self.client = Client()
         cache.clear()
+
+    def test_cursor_pages(self):
+        """Курсор ведёт на следующую страницу и обратно."""
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        ]
+        for page in pages:
+            with self.subTest(page=page):
+                first = self.client.get(page).context['page_obj']
+                self.assertEqual(len(first), POSTS_PER_PAGE)
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    page, {'cursor': first.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second), 3)
+                self.assertFalse(second.has_next())
+                back = self.client.get(
+                    page, {'cursor': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_page_number_fallback(self):
+        """Старые ссылки ?page=N продолжают работать."""
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу."""
+        response = self.client.get(reverse('posts:index'), {'cursor': '!!'})
+        self.assertEqual(len(response.context['page_obj']), POSTS_PER_PAGE)
+
+    def test_numeric_cursor_returns_first_page(self):
+        """Числовой курсор в ленте по дате отдаёт первую страницу."""
+        for value in (5, 1.5, True):
+            with self.subTest(value=value):
+                response = self.client.get(reverse('posts:index'), {
+                    'cursor': encode_cursor(value, 1)
+                })
+                self.assertEqual(len(response.context['page_obj']),
+                                 POSTS_PER_PAGE)
+
+    def test_oversized_cursor_returns_first_page(self):
+        """Курсор с id за пределами 64 бит отдаёт первую страницу."""
+        post = Post.objects.order_by('pub_date').first()
+        for pk in (10 ** 30, -10 ** 30, 2 ** 63):
+            with self.subTest(pk=pk):
+                response = self.client.get(reverse('posts:index'), {
+                    'cursor': encode_cursor(post.pub_date, pk)
+                })
+                self.assertEqual(len(response.context['page_obj']),
+                                 POSTS_PER_PAGE)
+
+
+class FeedQueriesTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='queries-slug'
+        )
+        self.author = User.objects.create(username='queries')
+        # Лента подписок тоже собирается из отложенных полей for_feed.
+        reader = User.objects.create(username='queries-reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+        cache.clear()
+
+    def create_posts(self, count):
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            Post.objects.create(
+                author=User.objects.create(username=f'author{i}'),
+                group=Group.objects.create(title=f'группа {i}', slug=f's{i}'),
+                text=f'пост {i}',
+            )
+            Post.objects.create(author=self.author, group=self.group,
+                                text=f'пост группы {i}')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_grow_with_page(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:follow_index'),
+        ]
+        self.create_posts(1)
+        small = {url: self.count_queries(url) for url in urls}
+        self.create_posts(POSTS_PER_PAGE)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), small[url])
+
+    def test_no_count_queries(self):
+        """Профиль и пост берут счётчики из AuthorStats, без COUNT."""
+        self.create_posts(1)
+        post = self.author.posts.first()
+        urls = [
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.context['stats'].post_count, 1)
+                self.assertFalse(
+                    [q for q in queries if 'COUNT(' in q['sql']]
+                )
+
+
+class FollowTimelineTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create(username='reader')
+        self.author = User.objects.create(username='writer')
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def get_feed(self):
+        return list(
+            self.client.get(reverse('posts:follow_index')).context['page_obj']
+        )
+
+    def follow(self):
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.author}))
+
+    def test_follow_backfills_and_fans_out(self):
+        """Подписка добавляет старые посты, новые попадают в ленту."""
+        old = Post.objects.create(author=self.author, text='старый')
+        self.follow()
+        new = Post.objects.create(author=self.author, text='новый')
+        self.assertEqual(self.get_feed(), [new, old])
+
+    def test_unfollow_cleans_timeline(self):
+        """После отписки посты автора пропадают из ленты."""
+        Post.objects.create(author=self.author, text='пост')
+        self.follow()
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': self.author}))
+        self.assertEqual(self.get_feed(), [])
+
+    def test_follow_changes_etag(self):
+        """Подписка меняет ETag ленты подписок."""
+        etag = self.client.get(reverse('posts:follow_index'))['ETag']
+        self.follow()
+        response = self.client.get(reverse('posts:follow_index'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_changes_profiles(self):
+        """Подписка меняет ETag и дату профилей автора и подписчика."""
+        guest = Client()
+        later = timezone.now() + timedelta(minutes=1)
+        pages = [reverse('posts:profile', kwargs={'username': user})
+                 for user in (self.author, self.reader)]
+        before = {page: guest.get(page) for page in pages}
+        with mock.patch('posts.feed_cache.timezone.now', return_value=later):
+            self.follow()
+        for page, response in before.items():
+            with self.subTest(page=page):
+                self.assertEqual(guest.get(
+                    page, HTTP_IF_NONE_MATCH=response['ETag']
+                ).status_code, 200)
+                self.assertEqual(guest.get(
+                    page, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                ).status_code, 200)
+
+    def test_follow_changes_feed_last_modified(self):
+        """Подписка сдвигает Last-Modified лент подписчика."""
+        page = reverse('posts:follow_index')
+        modified = self.client.get(page)['Last-Modified']
+        later = timezone.now() + timedelta(minutes=1)
+        with mock.patch('posts.feed_cache.timezone.now', return_value=later):
+            self.follow()
+        response = self.client.get(page, HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_keeps_shared_pages(self):
+        """Подписка сбрасывает только страницы подписчика."""
+        generation = feed_cache.get_generation()
+        self.follow()
+        self.assertEqual(feed_cache.get_generation(), generation)
+
+    def test_follow_buttons_use_one_query(self):
+        """Кнопки подписки на ленте стоят один запрос на всю страницу."""
+        for i in range(3):
+            Post.objects.create(
+                author=User.objects.create(username=f'other{i}'), text='пост'
+            )
+        Post.objects.create(author=self.author, text='пост')
+        self.follow()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            len([q for q in queries if 'posts_follow' in q['sql']]), 1
+        )
+        self.assertContains(response, 'Подписаться', count=3)
+        self.assertContains(response, 'Отписаться', count=1)
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': self.author}))
         response = self.client.get(reverse('posts:index'))
-        self.assertEqual(len(response.context['page_obj']), 1)
+        self.assertContains(response, 'Подписаться', count=4)
+
+    def test_timeline_is_bounded(self):
+        """Лента не длиннее TIMELINE_LENGTH."""
+        self.follow()
+        with mock.patch.object(timeline, 'TIMELINE_LENGTH', 2):
+            for i in range(4):
+                Post.objects.create(author=self.author, text=f'пост {i}')
+        self.assertEqual(self.reader.timeline.count(), 2)
+
+    def test_celebrity_posts_merged_on_read(self):
+        """Посты популярных авторов подмешиваются при чтении."""
+        self.follow()
+        old = Post.objects.create(author=self.author, text='до')
+        with mock.patch.object(timeline, 'CELEBRITY_FOLLOWERS', 1):
+            call_command('refresh_celebrities', stdout=StringIO())
+        self.assertFalse(self.reader.timeline.exists())
+        new = Post.objects.create(author=self.author, text='после')
+        self.assertFalse(self.reader.timeline.exists())
+        self.assertEqual(self.get_feed(), [new, old])
+        timeline.refresh_celebrities()
+        self.assertEqual(self.get_feed(), [new, old])
+        self.assertEqual(self.reader.timeline.count(), 2)
+
+    def test_feed_does_not_count_celebrities(self):
+        """Чтение ленты не пересчитывает популярных авторов."""
+        self.follow()
+        cache.delete(timeline.CELEBRITIES_KEY)
+        with CaptureQueriesContext(connection) as queries:
+            self.get_feed()
+        self.assertFalse(
+            [q for q in queries if 'GROUP BY' in q['sql']]
+        )
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='searcher')
+        cls.often = Post.objects.create(author=cls.user,
+                                        text='Кошка, кошка и снова кошка')
+        cls.once = Post.objects.create(author=cls.user,
+                                       text='На окне сидела кошка и смотрела')
+        Post.objects.create(author=cls.user, text='Собака')
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': query, **params})
+        return response.context['page_obj']
+
+    def test_search_ranks_results(self):
+        """Поиск находит посты и ставит релевантные выше."""
+        self.assertEqual(list(self.search('КОШКА')), [self.often, self.once])
+
+    def test_search_cursor(self):
+        """Результаты поиска листаются курсором."""
+        with mock.patch('posts.views.POSTS_PER_PAGE', 1):
+            first = self.search('кошка')
+            second = self.search('кошка', cursor=first.next_cursor)
+        self.assertEqual(list(first), [self.often])
+        self.assertEqual(list(second), [self.once])
+        self.assertFalse(second.has_next())
+
+    def test_database_backend_ignores_case(self):
+        """Запасной поиск без индекса не зависит от регистра кириллицы."""
+        loud = Post.objects.create(author=self.user, text='БОЛЬШАЯ КОШКА')
+        page = DatabaseSearchBackend().get_page('кошка', POSTS_PER_PAGE)
+        self.assertEqual(list(page), [loud, self.once, self.often])
+
+    def test_search_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        once = Post.objects.get(pk=self.once.pk)
+        once.text = 'На окне сидел кот'
+        once.save()
+        self.assertEqual(list(self.search('кот')), [once])
+        self.assertEqual(list(self.search('кошка')), [self.often])
+        Post.objects.filter(pk=self.often.pk).delete()
+        self.assertEqual(list(self.search('кошка')), [])
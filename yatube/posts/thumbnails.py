@@ -0,0 +1,118 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.sqlite import serialized_write
+
+from . import feed_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Все геометрии, которые используют шаблоны постов.
+GEOMETRIES = ('300x300', '960x339')
+OPTIONS = {'crop': 'center', 'upscale': True}
+PLACEHOLDER = 'img/placeholder.svg'
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Как get_thumbnail, но ничего не генерирует.
+
+        Возвращает None, если миниатюры ещё нет в хранилище ключей.
+        """
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = PregeneratedThumbnailBackend()
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def source_image(name):
+    """Картинка поста в том же хранилище, что и у поля Post.image.
+
+    От хранилища зависит ключ sorl, поэтому и шаблоны, и фоновые
+    задачи должны получать его одинаково.
+    """
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def generate(name):
+    """Создаёт миниатюры картинки для всех геометрий шаблонов."""
+    try:
+        for geometry in GEOMETRIES:
+            backend.get_thumbnail(source_image(name), geometry, **OPTIONS)
+        # Пул пишет в базу наравне с view, поэтому тоже под блокировкой.
+        serialized_write(ready, name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def ready(name):
+    """Миниатюры готовы: карточки и страницы с заглушкой устарели.
+
+    Новая версия поста меняет ключ карточки и ETag страницы поста,
+    новое поколение — ключи закешированных страниц лент.
+    """
+    Post.objects.filter(image=name).update(version=F('version') + 1)
+    feed_cache.bump_generation()
+
+
+def _generate_in_worker(name):
+    try:
+        generate(name)
+    finally:
+        connections.close_all()
+
+
+def schedule(name):
+    """Ставит генерацию миниатюр в фоновый пул.
+
+    При POSTS_THUMBNAIL_WORKERS = 0 миниатюры создаются сразу.
+    """
+    if not name:
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        generate(name)
+        return
+    _get_executor().submit(_generate_in_worker, name)
@@ -0,0 +1,220 @@
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, Q
+
+from .feed_cache import make_key
+from .follow_graph import FollowGraph
+from .models import Follow, Post, PostQuerySet, TimelineEntry
+from .paginators import CursorPaginator, MergedCursorPaginator
+
+TIMELINE_LENGTH = 500
+CELEBRITY_FOLLOWERS = 1000
+CELEBRITIES_KEY = make_key('timeline', 'celebrities')
+
+
+def celebrity_ids():
+    """Авторы, чьи посты не раскладываются по лентам, а сливаются при чтении.
+
+    Запросы только читают множество из кеша, чтобы fan-out и чтение
+    видели одно и то же; считает его refresh_celebrities.
+    """
+    return cache.get(CELEBRITIES_KEY, frozenset())
+
+
+def refresh_celebrities():
+    """Пересчитывает знаменитостей и приводит к ним ленты подписчиков.
+
+    Запускается командой refresh_celebrities по расписанию. Авторы,
+    вышедшие из множества, возвращаются в ленты, вошедшие — убираются
+    из них. Без прежнего множества ленты собираются заново.
+    """
+    ids = frozenset(
+        Follow.objects.values('author').annotate(
+            followers=Count('pk')
+        ).filter(
+            followers__gte=CELEBRITY_FOLLOWERS
+        ).values_list('author', flat=True)
+    )
+    previous = cache.get(CELEBRITIES_KEY)
+    # Сначала новое множество: посты, вышедшие за время сверки,
+    # уже раскладываются или сливаются по нему.
+    cache.set(CELEBRITIES_KEY, ids, None)
+    try:
+        with transaction.atomic(using=router.db_for_write(TimelineEntry)):
+            if previous is None:
+                rebuild_all()
+                return ids
+            TimelineEntry.objects.filter(author_id__in=ids - previous).delete()
+            for author_id in previous - ids:
+                restore_author(author_id)
+    except Exception:
+        # Следующий запуск повторит сверку с тем же прежним множеством.
+        if previous is None:
+            cache.delete(CELEBRITIES_KEY)
+        else:
+            cache.set(CELEBRITIES_KEY, previous, None)
+        raise
+    return ids
+
+
+def trim(user_id):
+    """Оставляет в ленте пользователя не больше TIMELINE_LENGTH записей."""
+    boundary = TimelineEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-post_id'
+    ).values_list('pub_date', 'post_id')[TIMELINE_LENGTH:TIMELINE_LENGTH + 1]
+    for pub_date, post_id in boundary:
+        TimelineEntry.objects.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date,
+                                         post_id__lte=post_id),
+            user_id=user_id,
+        ).delete()
+
+
+def trim_followers(author_id):
+    """Обрезает ленты всех подписчиков автора одним DELETE."""
+    table = TimelineEntry._meta.db_table
+    with connections[router.db_for_write(TimelineEntry)].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            ' SELECT id FROM ('
+            '  SELECT t.id, ROW_NUMBER() OVER (PARTITION BY t.user_id'
+            '  ORDER BY t.pub_date DESC, t.post_id DESC) AS position'
+            f'  FROM {table} t'
+            f'  JOIN {Follow._meta.db_table} f ON f.user_id = t.user_id'
+            '  WHERE f.author_id = %s'
+            ' ) ranked WHERE position > %s)',
+            [author_id, TIMELINE_LENGTH],
+        )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if post.author_id in celebrity_ids():
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post.pk,
+                          author_id=post.author_id, pub_date=post.pub_date)
+            for user_id in Follow.objects.filter(
+                author_id=post.author_id
+            ).values_list('user_id', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+    trim_followers(post.author_id)
+
+
+def restore_author(author_id):
+    """Возвращает посты автора в ленты подписчиков.
+
+    Нужно, когда автор перестал быть знаменитостью: его посты за это
+    время не раскладывались по лентам.
+    """
+    posts = list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')[:TIMELINE_LENGTH])
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id,
+                          pub_date=pub_date)
+            for user_id in Follow.objects.filter(
+                author_id=author_id
+            ).values_list('user_id', flat=True)
+            for pk, pub_date in posts
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    trim_followers(author_id)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if author_id in celebrity_ids():
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')[:TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id,
+                          pub_date=pub_date)
+            for pk, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def remove_author(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    for author_id in Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True
+    ):
+        backfill(user_id, author_id)
+
+
+def rebuild_all():
+    """Собирает ленты всех пользователей заново одним INSERT ... SELECT.
+
+    Для каждого подписчика берутся последние TIMELINE_LENGTH постов его
+    авторов, кроме знаменитостей: их посты сливаются при чтении.
+    """
+    alias = router.db_for_write(TimelineEntry)
+    TimelineEntry.objects.using(alias).delete()
+    celebrities = sorted(celebrity_ids())
+    excluded = ''
+    if celebrities:
+        excluded = 'WHERE f.author_id NOT IN ({})'.format(
+            ', '.join(['%s'] * len(celebrities))
+        )
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT user_id, post_id, author_id, pub_date FROM ('
+            ' SELECT f.user_id, p.id AS post_id, p.author_id, p.pub_date,'
+            ' ROW_NUMBER() OVER (PARTITION BY f.user_id'
+            ' ORDER BY p.pub_date DESC, p.id DESC) AS position'
+            f' FROM {Follow._meta.db_table} f'
+            f' JOIN {Post._meta.db_table} p ON p.author_id = f.author_id'
+            f' {excluded}'
+            ') ranked WHERE position <= %s',
+            [*celebrities, TIMELINE_LENGTH],
+        )
+
+
+def get_page(user, per_page, cursor=None):
+    """Страница ленты подписок: O(per_page) при любом числе подписок."""
+    entries = TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    ).only(
+        'pub_date', 'post_id',
+        *(f'post__{field}' for field in PostQuerySet.FEED_FIELDS)
+    )
+    paginator = CursorPaginator(entries, per_page, tiebreak='post_id')
+    celebrities = celebrity_ids() & FollowGraph(user).author_ids
+    if celebrities:
+        paginator = MergedCursorPaginator(
+            [
+                paginator,
+                CursorPaginator(
+                    Post.objects.for_feed().filter(
+                        author_id__in=celebrities
+                    ),
+                    per_page,
+                ),
+            ],
+            per_page,
+        )
+    page = paginator.get_page(cursor)
+    page.object_list = [
+        row.post if isinstance(row, TimelineEntry) else row for row in page
+    ]
+    return page
@@ -0,0 +1,254 @@
+import csv
+import json
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+from . import author_stats, feed_cache, timeline
+from .models import Comment, Group, Post, User
+from .search import get_search_backend
+
+CHUNK_SIZE = 2000
+BATCH_SIZE = 5000
+
+CSV_FIELDS = (
+    'model', 'id', 'slug', 'title', 'description', 'post', 'author',
+    'group', 'text', 'pub_date', 'image',
+)
+
+
+def export_records():
+    """Группы, посты и комментарии как словари, без загрузки в память.
+
+    Порядок важен для импорта: посты ссылаются на группы,
+    комментарии — на посты.
+    """
+    for slug, title, description in Group.objects.order_by('pk').values_list(
+        'slug', 'title', 'description'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        yield {'model': 'group', 'slug': slug, 'title': title,
+               'description': description}
+    for pk, author, group, text, pub_date, image in Post.objects.order_by(
+        'pk'
+    ).values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date', 'image'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        yield {'model': 'post', 'id': pk, 'author': author, 'group': group,
+               'text': text, 'pub_date': pub_date.isoformat(),
+               'image': image}
+    for pk, post, author, text, created in Comment.objects.order_by(
+        'pk'
+    ).values_list(
+        'pk', 'post_id', 'author__username', 'text', 'created'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        yield {'model': 'comment', 'id': pk, 'post': post, 'author': author,
+               'text': text, 'pub_date': created.isoformat()}
+
+
+def write_ndjson(records, stream):
+    count = 0
+    for count, record in enumerate(records, 1):
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return count
+
+
+def write_csv(records, stream):
+    writer = csv.DictWriter(stream, CSV_FIELDS)
+    writer.writeheader()
+    count = 0
+    for count, record in enumerate(records, 1):
+        writer.writerow(record)
+    return count
+
+
+def read_ndjson(stream):
+    """Пары (номер строки, запись)."""
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            yield number, json.loads(line)
+
+
+def read_csv(stream):
+    """Пары (номер строки, запись); пустые ячейки пропускаются."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {
+            key: value for key, value in row.items() if value != ''
+        }
+
+
+@contextmanager
+def keep_dates(*models):
+    """Отключает auto_now и auto_now_add, чтобы сохранить даты из файла."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    """Складывает записи в пачки и пишет их bulk_create.
+
+    Сигналы при bulk_create не отправляются, поэтому всё, что они
+    поддерживают, пересчитывается один раз в finish(). Посты и
+    комментарии сохраняют свои id, записи с уже занятыми id и slug
+    пропускаются. Комментарий не попадает к посту, чей id в файле
+    оказался занят постом другого автора или с другой датой.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.user_ids = {}
+        self.group_ids = {}
+        # Растёт только на совпадениях id с чужими постами, а не с файлом.
+        self.foreign_post_ids = set()
+        self.pending = {'group': [], 'post': [], 'comment': []}
+        self.counts = dict.fromkeys(self.pending, 0)
+
+    def add(self, record, line=None):
+        """Ставит запись в пачку; line — номер строки файла для ошибок."""
+        pending = self.pending.get(record.get('model'))
+        if pending is None:
+            where = f' (строка {line})' if line else ''
+            raise CommandError(
+                f'Неизвестный вид записи {record.get("model")!r}{where}.'
+            )
+        pending.append(record)
+        if len(pending) >= self.batch_size:
+            self.flush()
+
+    def _resolve_users(self, usernames):
+        missing = set(usernames) - self.user_ids.keys()
+        if not missing:
+            return
+        User.objects.bulk_create(
+            [User(username=name, password=make_password(None))
+             for name in missing],
+            ignore_conflicts=True,
+        )
+        self.user_ids.update(
+            User.objects.filter(username__in=missing).values_list(
+                'username', 'pk'
+            )
+        )
+
+    def _resolve_groups(self, slugs):
+        missing = set(filter(None, slugs)) - self.group_ids.keys()
+        if missing:
+            self.group_ids.update(
+                Group.objects.filter(slug__in=missing).values_list(
+                    'slug', 'pk'
+                )
+            )
+
+    def flush(self):
+        groups, posts, comments = (
+            self.pending['group'], self.pending['post'],
+            self.pending['comment'],
+        )
+        self._resolve_users(
+            record['author'] for record in posts + comments
+        )
+        with transaction.atomic(), keep_dates(Post, Comment):
+            Group.objects.bulk_create(
+                [Group(slug=record['slug'], title=record['title'],
+                       description=record.get('description', ''))
+                 for record in groups],
+                ignore_conflicts=True,
+            )
+            self._resolve_groups(
+                [record.get('group') for record in posts]
+            )
+            Post.objects.bulk_create(
+                [self._post(record) for record in posts],
+                ignore_conflicts=True,
+            )
+            self._match_posts(posts)
+            post_ids = self._comment_posts(comments)
+            Comment.objects.bulk_create(
+                [self._comment(record) for record in comments
+                 if int(record['post']) in post_ids],
+                ignore_conflicts=True,
+            )
+        for model, records in self.pending.items():
+            self.counts[model] += len(records)
+            records.clear()
+
+    def _match_posts(self, posts):
+        """Запоминает id постов файла, занятые в базе чужими постами.
+
+        Пост с тем же id, но другим автором или датой был в базе до
+        импорта, и комментарии из файла к нему не относятся.
+        """
+        expected = {
+            int(record['id']): (self.user_ids[record['author']],
+                                parse_datetime(record['pub_date']))
+            for record in posts
+        }
+        for pk, author_id, pub_date in Post.objects.filter(
+            pk__in=expected
+        ).values_list('pk', 'author_id', 'pub_date'):
+            if expected[pk] != (author_id, pub_date):
+                self.foreign_post_ids.add(pk)
+
+    def _comment_posts(self, comments):
+        """id постов пачки комментариев, к которым их можно добавить."""
+        ids = {int(record['post']) for record in comments}
+        return set(Post.objects.filter(pk__in=ids).values_list(
+            'pk', flat=True
+        )) - self.foreign_post_ids
+
+    def _comment(self, record):
+        return Comment(
+            pk=int(record['id']) if record.get('id') else None,
+            post_id=int(record['post']),
+            author_id=self.user_ids[record['author']],
+            text=record['text'],
+            created=parse_datetime(record['pub_date']),
+        )
+
+    def _post(self, record):
+        pub_date = parse_datetime(record['pub_date'])
+        return Post(
+            pk=int(record['id']),
+            author_id=self.user_ids[record['author']],
+            group_id=self.group_ids.get(record.get('group')),
+            text=record['text'],
+            image=record.get('image') or '',
+            pub_date=pub_date,
+            updated=pub_date,
+        )
+
+    def finish(self):
+        """Пересчитывает то, что при обычной записи делают сигналы."""
+        self.flush()
+        # id пришли из файла: последовательности надо догнать.
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [Post, Comment]
+            ):
+                cursor.execute(sql)
+        comments = Comment.objects.filter(post=OuterRef('pk')).order_by(
+        ).values('post').annotate(total=Count('pk')).values('total')
+        Post.objects.update(comment_count=Coalesce(Subquery(comments), 0))
+        author_stats.rebuild()
+        Post._meta.get_field('image').storage.recount()
+        get_search_backend().rebuild()
+        timeline.rebuild_all()
+        feed_cache.bump_generation()
+        return self.counts
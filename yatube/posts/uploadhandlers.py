@@ -0,0 +1,221 @@
+import hashlib
+import struct
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+ImageInfo = namedtuple(
+    'ImageInfo', 'format extension content_type width height'
+)
+
+# Заголовка такого размера хватает, чтобы найти размеры GIF, PNG и WebP;
+# сегменты JPEG до SOF пропускаются по длине и в заголовок не попадают.
+MAX_HEADER_SIZE = 64 * 1024
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def _gif(header):
+    if len(header) < 10:
+        return None
+    width, height = struct.unpack('<HH', header[6:10])
+    return ImageInfo('GIF', '.gif', 'image/gif', width, height)
+
+
+def _png(header):
+    if len(header) < 24:
+        return None
+    if header[12:16] != b'IHDR':
+        raise InvalidImage('Повреждённый PNG.')
+    width, height = struct.unpack('>II', header[16:24])
+    return ImageInfo('PNG', '.png', 'image/png', width, height)
+
+
+def _jpeg(header, offset=2):
+    """Ищет SOF среди сегментов JPEG, начиная с offset.
+
+    Возвращает (info, offset): без SOF offset — начало первого
+    неразобранного сегмента, он может лежать и за концом header.
+    """
+    while offset + 4 <= len(header):
+        if header[offset] != 0xFF:
+            raise InvalidImage('Повреждённый JPEG.')
+        marker = header[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > len(header):
+                return None, offset
+            height, width = struct.unpack('>HH', header[offset + 5:offset + 9])
+            info = ImageInfo('JPEG', '.jpg', 'image/jpeg', width, height)
+            return info, offset
+        length, = struct.unpack('>H', header[offset + 2:offset + 4])
+        offset += 2 + length
+    return None, offset
+
+
+def _webp(header):
+    if len(header) < 30:
+        return None
+    chunk = header[12:16]
+    if chunk == b'VP8X':
+        width = int.from_bytes(header[24:27], 'little') + 1
+        height = int.from_bytes(header[27:30], 'little') + 1
+    elif chunk == b'VP8L':
+        bits = int.from_bytes(header[21:25], 'little')
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+    elif chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', header[26:30])
+        width, height = width & 0x3FFF, height & 0x3FFF
+    else:
+        raise InvalidImage('Повреждённый WebP.')
+    return ImageInfo('WEBP', '.webp', 'image/webp', width, height)
+
+
+def probe(header):
+    """Определяет формат и размеры картинки по первым байтам.
+
+    Возвращает None, если байтов пока недостаточно.
+    """
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return _gif(header)
+    if header[:8] == b'\x89PNG\r\n\x1a\n':
+        return _png(header)
+    if header[:3] == b'\xff\xd8\xff':
+        return _jpeg(header)[0]
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return _webp(header)
+    if len(header) < 12:
+        return None
+    raise InvalidImage('Загрузите картинку в формате GIF, PNG, JPEG или WebP.')
+
+
+class HeaderReader:
+    """Начало загружаемого файла, пока в нём не нашлись размеры.
+
+    JPEG читается посегментно: разобранные сегменты выбрасываются,
+    а тело длинного сегмента (ICC-профиль, EXIF с превью) пропускается
+    по мере поступления, не занимая заголовок.
+    """
+
+    def __init__(self):
+        self.header = b''
+        self.skip = 0
+        self.jpeg = False
+
+    def feed(self, data):
+        """Добавляет байты и возвращает ImageInfo или None."""
+        if self.skip:
+            skipped = min(self.skip, len(data))
+            self.skip -= skipped
+            data = data[skipped:]
+        self.header += data
+        if not self.jpeg:
+            if self.header[:3] != b'\xff\xd8\xff':
+                self.header = self.header[:MAX_HEADER_SIZE]
+                return probe(self.header)
+            self.jpeg = True
+            self.header = self.header[2:]
+        info, offset = _jpeg(self.header, 0)
+        if info is None:
+            self.skip += max(offset - len(self.header), 0)
+            self.header = self.header[offset:]
+        return info
+
+
+def check_image(info):
+    if info.width * info.height > settings.POSTS_IMAGE_MAX_PIXELS:
+        raise InvalidImage('Слишком большое разрешение картинки.')
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Потоковая загрузка картинок постов.
+
+    Проверяет размер и число пикселей по мере поступления байтов,
+    определяет формат по сигнатуре и сохраняет файл под именем,
+    равным sha256 содержимого. Отвергнутые файлы не попадают в
+    request.FILES, причина остаётся в request.upload_errors.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        if request is not None and not hasattr(request, 'upload_errors'):
+            request.upload_errors = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra
+        )
+        self.reader = HeaderReader()
+        self.info = None
+        self.size = 0
+        self.hasher = hashlib.sha256()
+
+    def discard(self, message):
+        self.file.close()
+        self.request.upload_errors[self.field_name] = message
+
+    def reject(self, message):
+        self.discard(message)
+        raise SkipFile()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.POSTS_IMAGE_MAX_SIZE:
+            self.reject('Файл слишком большой.')
+        if self.info is None:
+            try:
+                self.info = self.reader.feed(raw_data)
+                if self.info is not None:
+                    check_image(self.info)
+            except InvalidImage as error:
+                self.reject(str(error))
+            if (self.info is None
+                    and len(self.reader.header) >= MAX_HEADER_SIZE):
+                self.reject('Не удалось определить размер картинки.')
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.info is None:
+            # SkipFile здесь уже не поймают: просто не отдаём файл.
+            self.discard('Не удалось определить размер картинки.')
+            return None
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hasher.hexdigest()
+        self.file.name = self.file.sha256 + self.info.extension
+        self.file.content_type = self.info.content_type
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+def image_upload(view):
+    """Подключает ImageUploadHandler к view.
+
+    Обработчик нужно поставить до чтения request.POST, а это делает
+    CsrfViewMiddleware, поэтому CSRF проверяется внутри декоратора.
+    Других обработчиков нет: файл не должен оседать в памяти.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
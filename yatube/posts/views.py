@@ -1,79 +1,142 @@
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+from core.routers import replica_reads
+from core.sqlite import serialized_write
 from django.shortcuts import get_object_or_404, redirect, render
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Comment, Follow
-from django.core.cache import cache
+from .models import Group, Post, User, Follow
+from .paginators import CursorPaginator, materialize
+from .search import get_search_backend, terms
+from .uploadhandlers import image_upload
+from . import author_stats, feed_cache, follow_graph, thumbnails, timeline
+from .conditional import (detail_post, feed_etag, feed_last_modified,
+                          post_etag, post_last_modified, profile_author,
+                          profile_etag, profile_last_modified)
 
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 50
 
 
-def index(request):
-    paginator = cache.get("posts_paginator", None)
-    if paginator is None:
-        paginator = Paginator(Post.objects.all(), POSTS_PER_PAGE)
-        cache.set("posts_paginator", paginator, 20)
+def get_page_obj(request, queryset):
+    """Курсорная пагинация; ?page=N оставлен для старых ссылок."""
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if page_number is not None:
+        return Paginator(queryset, POSTS_PER_PAGE).get_page(page_number)
+    paginator = CursorPaginator(queryset, POSTS_PER_PAGE)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def schedule_thumbnails(post):
+    """Миниатюры создаются в фоне после коммита, а не при первом показе."""
+    if post.image:
+        name = post.image.name
+        transaction.on_commit(lambda: thumbnails.schedule(name))
+
+
+@replica_reads
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
+def index(request):
+    page_obj = feed_cache.get_page(
+        f"index:{request.GET.get('page')}:{request.GET.get('cursor')}",
+        lambda: materialize(get_page_obj(request, Post.objects.for_feed())),
+    )
     context = {
         'page_obj': page_obj,
+        'follows': follow_graph.for_request(request),
+        'index': True,
     }
     return render(request, 'posts/index.html', context)
 
 
+@replica_reads
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
 def group_list(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()[:POSTS_PER_PAGE]
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_page_obj(request, group.posts.for_feed())
     context = {
         'group': group,
-        'posts': posts,
         'page_obj': page_obj,
+        'follows': follow_graph.for_request(request),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@replica_reads
+@condition(etag_func=profile_etag, last_modified_func=profile_last_modified)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    post_count = post_list.count
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = profile_author(request, username)
+    if author is None:
+        raise Http404('Автор не найден')
+    post_list = author.posts.for_feed()
+    page_obj = get_page_obj(request, post_list)
     context = {
         'page_obj': page_obj,
         'username': author,
-        'paginator': paginator,
-        'post_count': post_count
+        'author': author,
+        'stats': author_stats.for_user(author),
+        'following': author in follow_graph.for_request(request),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@replica_reads
+@condition(etag_func=post_etag, last_modified_func=post_last_modified)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = Comment.objects.select_related('post')
+    post = detail_post(request, post_id)
+    if post is None:
+        raise Http404('Пост не найден')
+    comments = CursorPaginator(
+        post.comments.select_related('author'),
+        COMMENTS_PER_PAGE,
+        field='created',
+        descending=False,
+    ).get_page(request.GET.get('cursor'))
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
+        'stats': author_stats.for_user(post.author),
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'page_obj': comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if terms(query):
+        page_obj = get_search_backend().get_page(
+            query, POSTS_PER_PAGE, request.GET.get('cursor')
+        )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'follows': follow_graph.for_request(request),
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@image_upload
 def post_create(request):
     title = 'Добавить запись'
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None
+        files=request.FILES or None,
+        upload_errors=request.upload_errors
     )
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        serialized_write(post.save)
+        schedule_thumbnails(post)
         return redirect('posts:profile', post.author.username)
     context = {
         'form': form,
@@ -83,15 +146,19 @@ def post_create(request):
 
 
 @login_required
+@image_upload
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     is_edit = True
     if request.user != post.author:
         form = PostForm(request.POST or None, instance=post)
         return redirect('posts:post_detail', post_id)
-    form = PostForm(request.POST, files=request.FILES or None, instance=post)
+    form = PostForm(request.POST, files=request.FILES or None, instance=post,
+                    upload_errors=request.upload_errors)
     if form.is_valid():
-        post.save()
+        serialized_write(post.save_new_version)
+        if 'image' in form.changed_data:
+            schedule_thumbnails(post)
         return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -109,17 +176,19 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        serialized_write(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@replica_reads
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
 def follow_index(request):
-    following_authors = request.user.following.values_list('author_id',
-                                                           flat=True)
-    posts_following = Post.objects.filter(author_id__in=following_authors)
+    page_obj = timeline.get_page(request.user, POSTS_PER_PAGE,
+                                 request.GET.get('cursor'))
     context = {
-        'posts_following': posts_following,
+        'page_obj': page_obj,
+        'follow': True,
     }
     return render(request, 'posts/follow.html', context)
 
@@ -127,27 +196,20 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author_following = get_object_or_404(User, username=username)
-    if (
-        Follow.objects.filter(author=author_following,
-                              user=request.user).exists()
-        or request.user == author_following
-    ):
-        return redirect('posts:profile', username=username)
-    Follow.objects.create(
-        user=request.user,
-        author=author_following,
-    )
+    if request.user != author_following:
+        serialized_write(
+            Follow.objects.get_or_create,
+            user=request.user,
+            author=author_following,
+        )
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author_following = get_object_or_404(User, username=username)
-    if (
+    serialized_write(
         Follow.objects.filter(author=author_following,
-                              user=request.user).exists()
-        or request.user == author_following
-    ):
-        return redirect('posts:profile', username=username)
-    Follow.objects.filter(author=author_following, user=request.user).delete()
+                              user=request.user).delete
+    )
     return redirect('posts:profile', username=username)
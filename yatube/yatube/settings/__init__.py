@@ -0,0 +1,7 @@
+import os
+
+# Профиль настроек: dev (по умолчанию) или prod, см. соседние модули.
+if os.environ.get('DJANGO_ENV', 'dev') == 'prod':
+    from .prod import *  # noqa: F401, F403
+else:
+    from .dev import *  # noqa: F401, F403
@@ -0,0 +1,253 @@
+import os
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+def env_bool(name, default=False):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+# manage.py test или pytest.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+
+SECRET_KEY = '7dky0bh0d*bfzrm_ql=aay7doptp=o(fvax7*hwqgsvghllo@3'
+
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    'localhost',
+    '127.0.0.1',
+    '[::1]',
+    'testserver',
+]
+
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'posts.apps.PostsConfig',
+    'users.apps.UsersConfig',
+    'core.apps.CoreConfig',
+    'about.apps.AboutConfig',
+    'sorl.thumbnail',
+]
+
+MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.routers.PrimaryStickinessMiddleware',
+]
+
+ROOT_URLCONF = 'yatube.urls'
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+TEMPLATES = [
+    {
+        'BACKEND': 'core.metrics.DjangoTemplates',
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'core.context_processors.year.year',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'yatube.wsgi.application'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    }
+}
+
+# Реплики только для чтения: REPLICA_DATABASES=путь1,путь2.
+# Без неё реплика — второе соединение к той же базе.
+# В тестах реплики смотрят в тестовую базу default.
+DATABASE_REPLICAS = []
+for number, name in enumerate(
+    os.environ.get('REPLICA_DATABASES', DATABASES['default']['NAME']).split(','),
+    start=1,
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# PRAGMA для каждого нового соединения с SQLite, см. core/signals.py.
+# SQLITE_TUNING включает профиль prod: WAL, чтобы чтения не ждали
+# записи, и ожидание чужой блокировки вместо ошибки database is locked.
+SQLITE_PRAGMAS = {}
+SQLITE_TUNING = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+# Записи из view идут по одной через файловую блокировку, см. core/sqlite.py.
+SQLITE_WRITE_LOCK = DATABASES['default']['NAME'] + '.lock'
+SQLITE_WRITE_RETRIES = 5
+SQLITE_WRITE_BACKOFF = 0.05
+
+# Сколько секунд после записи пользователь читает из default.
+PRIMARY_STICKY_SECONDS = 10
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+LANGUAGE_CODE = "ru"
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+STATIC_URL = '/static/'
+
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+# collectstatic кладёт сюда файлы с хешем в имени и их .gz/.br копии,
+# отдаёт их core.staticfiles.StaticFilesApp из wsgi.py.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
+
+STATICFILES_FINDERS = ('django.contrib.staticfiles.finders.AppDirectoriesFinder',
+                       'django.contrib.staticfiles.finders.FileSystemFinder',)
+
+LOGIN_URL = 'users:login'
+LOGIN_REDIRECT_URL = 'posts:index'
+# LOGOUT_REDIRECT_URL = 'posts:index'
+
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Кто отправляет файлы из MEDIA_ROOT: '' — сам Django (через sendfile
+# в gunicorn), 'x-sendfile' — Apache или lighttpd, 'x-accel-redirect' —
+# nginx, у которого internal location на MEDIA_ACCEL_PREFIX.
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Кеш общий для всех процессов: по умолчанию файл SQLite рядом с базой,
+# MEMCACHED_LOCATION=host:port переключает на memcached (python-memcached).
+# Тесты пишут в свой файл, чтобы не сбрасывать кеш запущенного сервера.
+# CACHE_VERSION меняют при выкладке, несовместимой со старыми значениями.
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(
+            tempfile.gettempdir(), 'yatube-test-cache.sqlite3'
+        ) if TESTING else os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'KEY_PREFIX': 'yatube',
+        'VERSION': int(os.environ.get('CACHE_VERSION', 1)),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+if os.environ.get('MEMCACHED_LOCATION'):
+    CACHES['default'].update({
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ['MEMCACHED_LOCATION'],
+        'OPTIONS': {},
+    })
+
+# Фоновые потоки, создающие миниатюры картинок постов; 0 — сразу в запросе.
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Ограничения на картинки постов, проверяются во время загрузки.
+POSTS_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+
+# Полнотекстовый поиск по постам, см. posts/search.py.
+POSTS_SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+
+CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Предупреждать в логе о медленных настройках при старте воркера.
+PERFORMANCE_CHECKS_AT_STARTUP = False
+
+# /metrics отдаётся только с заголовком Authorization: Bearer <токен>;
+# без токена эндпоинт выключен.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Медленные запросы: порог и доля тех, что попадают в лог с разбором SQL.
+METRICS_SLOW_REQUEST_MS = 500
+METRICS_TRACE_SAMPLE_RATE = 0.1
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+        'slow_requests': {
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'slow_requests.log'),
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'yatube.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'yatube.checks': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
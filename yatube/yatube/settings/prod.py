@@ -0,0 +1,67 @@
+import os
+
+from .base import *  # noqa: F401, F403
+from .base import (
+    DATABASES, MIDDLEWARE, SQLITE_TUNING, TEMPLATE_LOADERS, TEMPLATES,
+    env_bool,
+)
+
+DEBUG = env_bool('DEBUG')
+
+SECRET_KEY = os.environ['SECRET_KEY']
+
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost').split(',')
+
+# POSTGRES_DB переключает основную базу на PostgreSQL (нужен psycopg2
+# из requirements.txt), реплики тогда перечисляются в
+# POSTGRES_REPLICA_HOSTS. Без неё остаётся SQLite в WAL.
+if os.environ.get('POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['POSTGRES_DB'],
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', ''),
+            'PORT': os.environ.get('POSTGRES_PORT', ''),
+        }
+    }
+    DATABASE_REPLICAS = []
+    for number, host in enumerate(
+        filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',')),
+        start=1,
+    ):
+        alias = f'replica{number}'
+        DATABASES[alias] = {
+            **DATABASES['default'],
+            'HOST': host,
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICAS.append(alias)
+else:
+    SQLITE_PRAGMAS = SQLITE_TUNING
+
+# Соединение с базой живёт между запросами, а не открывается на каждый.
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = int(os.environ.get('CONN_MAX_AGE', 600))
+
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+]
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Сжатие и ETag для всех ответов, сразу после SecurityMiddleware.
+_after_security = MIDDLEWARE.index(
+    'django.middleware.security.SecurityMiddleware'
+) + 1
+MIDDLEWARE = MIDDLEWARE[:_after_security] + [
+    'core.middleware.GZipMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+] + MIDDLEWARE[_after_security:]
+
+EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+
+PERFORMANCE_CHECKS_AT_STARTUP = True
@@ -1,15 +1,14 @@
 import os
-import sys
 
-from django.core.wsgi import get_wsgi_application
-from django.contrib.staticfiles.handlers import StaticFilesHandler
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
-application = StaticFilesHandler(get_wsgi_application())
+from django.core.wsgi import get_wsgi_application  # noqa: E402
 
-path = 'C:/Users/kasum/Dev/hw02_community/yatube'
-if path not in sys.path:
-    sys.path.append(path)
+from core.checks import report_at_startup  # noqa: E402
+from core.staticfiles import StaticFilesApp  # noqa: E402
+from core.templates_warmup import warm_up  # noqa: E402
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+application = StaticFilesApp(get_wsgi_application())
 
-application = get_wsgi_application()
+warm_up()
+report_at_startup()